@@ -0,0 +1,7 @@
+MODULES = [
+    'benchmarks.bench_dsl',
+    'benchmarks.bench_executor',
+    'benchmarks.bench_dep',
+    'benchmarks.bench_ctx',
+    'benchmarks.bench_docker',
+]
@@ -0,0 +1,65 @@
+"""
+Run the benchmark suite and compare it against the stored baseline.
+
+.. code-block:: bash
+
+    python -m benchmarks                       # compare against benchmarks/baseline.json (see benchmarks.harness)
+    python -m benchmarks --match executor      # run a subset
+    python -m benchmarks --max-size 100000     # include the largest graphs
+    python -m benchmarks --save                # store the results as the new baseline
+    python -m benchmarks.memory                # bytes allocated per node
+
+Exits with a non-zero code if any benchmark is slower than the baseline by more than ``--threshold``.
+"""
+import argparse
+import sys
+
+from benchmarks import MODULES
+from benchmarks.harness import REGISTRY, BASELINE_PATH, load_baseline, save_baseline, run
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='benchmarks')
+    parser.add_argument('--match', default=None, help='only run benchmarks which names contain this string')
+    parser.add_argument('--max-size', type=int, default=1000,
+                        help='skip the parameters larger than this (the baseline is stored up to the default)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown relative to the baseline')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='times a regression is measured again before it is reported')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--samples', type=int, default=3,
+                        help='times every benchmark is measured with --save, storing the median')
+
+    ns = parser.parse_args(args)
+
+    for mod in MODULES:
+        __import__(mod)
+
+    report = run(
+        REGISTRY,
+        load_baseline(ns.baseline),
+        threshold=ns.threshold,
+        max_size=ns.max_size,
+        repeat=ns.repeat,
+        match=ns.match,
+        retries=ns.retries,
+        samples=ns.samples if ns.save else 1,
+    )
+
+    print(report.format())
+
+    if ns.save:
+        save_baseline(report, ns.baseline)
+        return 0
+
+    if report.regressions:
+        print(f'{len(report.regressions)} regression(s) above {ns.threshold:.0%}', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+from benchmarks.harness import bench
+from xmake.dsl import Ctx
+
+DEPTHS = (10, 100, 1000)
+READS = 10000
+
+
+@bench(*DEPTHS)
+def bench_ctx_push(depth):
+    def run():
+        for _ in range(READS // depth):
+            ctx = Ctx()
+
+            for i in range(depth):
+                ctx = ctx.push(f'x{i}', i)
+
+    return run
+
+
+@bench(*DEPTHS)
+def bench_ctx_get_top(depth):
+    ctx = Ctx()
+
+    for i in range(depth):
+        ctx = ctx.push(f'x{i}', i)
+
+    name = f'x{depth - 1}'
+
+    def run():
+        for _ in range(READS):
+            ctx.get(name)
+
+    return run
+
+
+@bench(*DEPTHS)
+def bench_ctx_get_bottom(depth):
+    ctx = Ctx()
+
+    for i in range(depth):
+        ctx = ctx.push(f'x{i}', i)
+
+    def run():
+        for _ in range(READS):
+            ctx.get('x0')
+
+    return run
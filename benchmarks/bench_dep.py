@@ -0,0 +1,53 @@
+from benchmarks.harness import bench
+from xmake.dep import Deps, KeyedDeps
+
+SIZES = (1000, 10000, 100000)
+
+
+@bench(*SIZES)
+def bench_deps_chain(n):
+    def run():
+        d = Deps()
+
+        d.put(0)
+
+        while d.peek() is not None:
+            i = d.pop()
+
+            if isinstance(i, int) and i < n:
+                d.put(('wait', i), i + 1)
+                d.put(i + 1)
+
+    return run
+
+
+@bench(*SIZES)
+def bench_deps_fan_in(n):
+    def run():
+        d = Deps()
+
+        d.put(-1, *range(n))
+
+        for i in range(n):
+            d.put(i)
+
+        while d.peek() is not None:
+            d.pop()
+
+    return run
+
+
+@bench(*SIZES)
+def bench_keyed_deps(n):
+    def run():
+        d = KeyedDeps(lambda x: x)
+
+        d.put(-1, *range(n))
+
+        for i in range(n):
+            d.put(i)
+
+        while d.peek() is not None:
+            d.pop()
+
+    return run
@@ -0,0 +1,115 @@
+from itertools import count
+
+from benchmarks.harness import bench
+from xmake.dsl import With, Map, Seq
+from xmake.executor import Executor
+from xmake.op.docker import ImagePull, ContainerCreate, ContainerStart, ContainerWait, ContainerRemove, \
+    ContainerConfig
+from xmake_tests.op.fake_docker import FakeDockerServer
+
+SIZES = (10, 100, 1000)
+
+
+class FakeAPI:
+    """Just enough of ``docker.APIClient`` for the container lifecycle, answering immediately"""
+
+    api_version = '1.35'
+
+    def __init__(self):
+        self.ids = count()
+        self.containers = {}
+
+    def pull(self, repo, tag, **kwargs):
+        return iter([{'status': f'Pulling {repo}:{tag}'}])
+
+    def images(self, *args, **kwargs):
+        return [{'Id': 'sha256:' + '0' * 64, 'RepoTags': ['alpine:3.5']}]
+
+    def create_container_from_config(self, cfg, name=None):
+        ident = f'{next(self.ids):064x}'
+        self.containers[ident] = cfg
+        return {'Id': ident, 'Warnings': []}
+
+    def start(self, ident):
+        assert ident in self.containers, ident
+
+    def wait(self, ident, timeout=None):
+        return {'StatusCode': 0}
+
+    def remove_container(self, ident, v=False, link=False, force=False):
+        del self.containers[ident]
+
+
+class FakeClient:
+    def __init__(self):
+        self.api = FakeAPI()
+
+
+def pipeline(n, docker=None):
+    return With(
+        FakeClient() if docker is None else docker,
+        lambda docker: With(
+            ImagePull('alpine:3.5'),
+            lambda i: Map(
+                lambda x: With(
+                    lambda: ContainerCreate(i, None, ['true'], ContainerConfig(labels={'bench': '1'})),
+                    lambda c: Seq(
+                        lambda: ContainerStart(c),
+                        lambda: ContainerWait(c),
+                        lambda: ContainerRemove(c),
+                    )
+                ),
+                list(range(n))
+            )
+        )
+    )
+
+
+@bench(*SIZES)
+def bench_lifecycle(n):
+    body = pipeline(n)
+
+    def run():
+        Executor().execute(body)
+
+    return run
+
+
+@bench(*SIZES)
+def bench_lifecycle_server(n):
+    """The same pipeline going through HTTP to :class:`FakeDockerServer`"""
+    server = FakeDockerServer().start()
+    body = pipeline(n, server.url)
+
+    def run():
+        try:
+            Executor().execute(body)
+        finally:
+            server.stop()
+
+    return run
+
+
+def pulls(n, policy):
+    server = FakeDockerServer().start()
+    body = With(server.url, lambda docker: Map(lambda x: ImagePull('alpine:3.5', policy=policy), list(range(n))))
+
+    def run():
+        try:
+            Executor().execute(body)
+        finally:
+            server.stop()
+
+    return run
+
+
+@bench(*SIZES)
+def bench_pull_always(n):
+    """``n`` pulls of the same image from :class:`FakeDockerServer`"""
+    return pulls(n, 'always')
+
+
+@bench(*SIZES)
+def bench_pull_if_missing(n):
+    """The same pulls found in the index of the images after the first one"""
+    return pulls(n, 'if-missing')
@@ -0,0 +1,72 @@
+from benchmarks.harness import bench
+from xmake.dsl import Seq, Con, Par, Map, Match, Case, Fun, Var
+
+SIZES = (1000, 10000, 100000)
+
+
+@bench(*SIZES)
+def bench_seq(n):
+    items = list(range(n))
+
+    def run():
+        Seq(*items)
+
+    return run
+
+
+@bench(*SIZES)
+def bench_par(n):
+    items = list(range(n))
+
+    def run():
+        Par(*items)
+
+    return run
+
+
+@bench(*SIZES)
+def bench_con(n):
+    items = list(range(n))
+
+    def run():
+        for x in items:
+            Con(x)
+
+    return run
+
+
+@bench(*SIZES)
+def bench_map(n):
+    items = list(range(n))
+
+    def run():
+        for _ in range(n // 5):
+            Map(lambda x: x * x, items)
+
+    return run
+
+
+@bench(*SIZES)
+def bench_match(n):
+    items = list(range(n // 10))
+
+    def run():
+        for _ in range(10):
+            Match(
+                Var('m'),
+                5,
+                *[Case(Var('m') == x, x) for x in items]
+            )
+
+    return run
+
+
+@bench(*SIZES)
+def bench_fun_call(n):
+    items = list(range(n))
+
+    def run():
+        fn = Fun(lambda a: Seq(*items, a))
+        fn(1)
+
+    return run
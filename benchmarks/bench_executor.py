@@ -0,0 +1,122 @@
+from benchmarks.harness import bench
+from xmake.dsl import Seq, Par, Map, Fil, Match, Case, Fun, With, Con, Source, Var
+from xmake.executor import Executor
+
+SIZES = (100, 1000, 10000)
+
+
+def _executes(body, compile=False):
+    def run():
+        Executor(compile=compile).execute(body)
+
+    return run
+
+
+@bench(*SIZES)
+def bench_seq(n):
+    return _executes(Seq(*range(n)))
+
+
+@bench(*SIZES)
+def bench_seq_compiled(n):
+    return _executes(Seq(*range(n)), compile=True)
+
+
+@bench(*SIZES)
+def bench_par(n):
+    return _executes(Par(*range(n)))
+
+
+@bench(*SIZES)
+def bench_map(n):
+    return _executes(Map(lambda x: x * x, list(range(n))))
+
+
+@bench(*SIZES)
+def bench_map_stream(n):
+    return _executes(Map(lambda x: x * x, Source(lambda: range(n))))
+
+
+@bench(*SIZES)
+def bench_map_fil(n):
+    return _executes(Map(lambda x: x + 1, Fil(lambda x: x > 5, list(range(n)))))
+
+
+@bench(*SIZES)
+def bench_map_fil_compiled(n):
+    return _executes(Map(lambda x: x + 1, Fil(lambda x: x > 5, list(range(n)))), compile=True)
+
+
+@bench(*SIZES)
+def bench_match(n):
+    return _executes(
+        Map(
+            lambda x: Match(
+                x,
+                lambda m: [
+                    Case(m == 0, 'a'),
+                    Case(m == 1, 'b'),
+                    Case(m == 2, 'c'),
+                    Case(True, 'd'),
+                ]
+            ),
+            [x % 4 for x in range(n)]
+        )
+    )
+
+
+@bench(*SIZES)
+def bench_match_compiled(n):
+    return _executes(
+        Map(
+            lambda x: Match(
+                x,
+                lambda m: [
+                    Case(m == 0, 'a'),
+                    Case(m == 1, 'b'),
+                    Case(m == 2, 'c'),
+                    Case(True, 'd'),
+                ]
+            ),
+            [x % 4 for x in range(n)]
+        ),
+        compile=True
+    )
+
+
+def _deep_context(n, depth=32):
+    # a variable read under `depth` other bindings
+    body = Map(lambda x: x + Var('v0'), list(range(n)))
+
+    for i in reversed(range(depth)):
+        body = With(Var(f'v{i}'), i, body)
+
+    return body
+
+
+@bench(*SIZES)
+def bench_var(n):
+    return _executes(_deep_context(n))
+
+
+@bench(*SIZES)
+def bench_var_compiled(n):
+    return _executes(_deep_context(n), compile=True)
+
+
+@bench(*SIZES)
+def bench_fun_call(n):
+    return _executes(
+        With(
+            Fun(lambda a, b: a + b),
+            lambda fn: Map(
+                lambda x: fn(x, x),
+                list(range(n))
+            )
+        )
+    )
+
+
+@bench(*SIZES)
+def bench_con(n):
+    return _executes(Par(*[Con(x) for x in range(n)]))
@@ -0,0 +1,194 @@
+"""
+Timing of the benchmarks relative to a calibration loop.
+
+Every run of a benchmark is divided by the time of :func:`calibration` measured right before it in the same process,
+so the stored baseline compares the code rather than the speed of the host (or of its other load at the moment).
+"""
+import gc
+import json
+import os
+from time import perf_counter
+from typing import Callable, Any, List, Dict, Optional, Tuple
+
+from dataclasses import dataclass, field
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+@dataclass
+class Bench:
+    name: str
+    setup: Callable[[Any], Callable[[], Any]]
+    params: List[Any]
+
+    def key(self, param: Any) -> str:
+        return self.name if param is None else f'{self.name}[{param}]'
+
+
+REGISTRY: List[Bench] = []
+
+
+def bench(*params: Any):
+    """
+    Register a benchmark; the decorated function receives a parameter and returns the callable to be timed.
+
+    .. code-block:: python
+        :linenos:
+
+        @bench(1000, 10000)
+        def bench_put(n):
+            items = list(range(n))
+
+            def run():
+                ...
+
+            return run
+    """
+
+    def wrapper(fn: Callable[[Any], Callable[[], Any]]):
+        name = fn.__module__.split('.')[-1] + '.' + fn.__name__
+        REGISTRY.append(Bench(name, fn, list(params) if params else [None]))
+        return fn
+
+    return wrapper
+
+
+def _timed(run: Callable[[], Any]) -> float:
+    gc.collect()
+    gc.disable()
+
+    try:
+        started = perf_counter()
+        run()
+        return perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def measure(setup: Callable[[], Callable[[], Any]], repeat: int = 3) -> Tuple[float, float]:
+    """
+    Run a freshly set up callable ``repeat`` times, each right after a run of :func:`calibration`.
+
+    :return: the best time in seconds of the callable and of the calibration
+    """
+    took, unit = [], []
+
+    for _ in range(repeat):
+        run = setup()
+
+        unit.append(_timed(calibration))
+        took.append(_timed(run))
+
+    return min(took), min(unit)
+
+
+def calibration(n: int = 100000):
+    """A fixed amount of the interpreter work the benchmarks are made of: calls, attribute and dict accesses"""
+    d = {}
+    x = Bench('calibration', calibration, [])
+
+    for i in range(n):
+        k = i & 255
+        d[k] = d.get(k, 0) + len(x.name)
+
+
+@dataclass
+class Result:
+    key: str
+    took: float
+    unit: float
+    """Time of :func:`calibration` measured right before :attr:`took`"""
+    baseline: Optional[float] = None
+    """Time relative to :attr:`unit` stored in the baseline"""
+
+    @property
+    def relative(self) -> float:
+        return self.took / self.unit
+
+    @property
+    def ratio(self) -> Optional[float]:
+        if self.baseline is None:
+            return None
+        return self.relative / self.baseline
+
+
+@dataclass
+class Report:
+    threshold: float
+    results: List[Result] = field(default_factory=list)
+
+    @property
+    def regressions(self) -> List[Result]:
+        return [x for x in self.results if x.ratio is not None and x.ratio > 1. + self.threshold]
+
+    def format(self) -> str:
+        lines = []
+
+        for r in self.results:
+            cmp = '' if r.ratio is None else f'{r.ratio:7.2f}x'
+            flag = ' REGRESSION' if r in self.regressions else ''
+            lines.append(f'{r.key:<48} {r.took * 1000:12.3f} ms {r.relative:10.3f} u {cmp}{flag}')
+
+        return '\n'.join(lines)
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, float]:
+    """:return: the times of the benchmarks relative to the calibration loop, by key"""
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f_obj:
+        return json.load(f_obj)
+
+
+def save_baseline(report: Report, path: str = BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline.update({x.key: x.relative for x in report.results})
+
+    with open(path, 'w+') as f_obj:
+        json.dump(baseline, f_obj, indent=4, sort_keys=True)
+        f_obj.write('\n')
+
+
+def run(
+        benches: List[Bench],
+        baseline: Dict[str, float],
+        threshold: float = 0.25,
+        max_size: Optional[int] = None,
+        repeat: int = 3,
+        match: Optional[str] = None,
+        retries: int = 2,
+        samples: int = 1,
+) -> Report:
+    """
+    :param retries: times a benchmark slower than the baseline is measured again before it is reported, so that a
+        moment of load on the host is not taken for a regression
+    :param samples: times every benchmark is measured, keeping the median; used for the baseline, so that the best of
+        the retries is compared against a typical time rather than a lucky one
+    """
+    report = Report(threshold)
+
+    for b in benches:
+        for param in b.params:
+            if max_size is not None and isinstance(param, int) and param > max_size:
+                continue
+
+            key = b.key(param)
+
+            if match and match not in key:
+                continue
+
+            def result() -> Result:
+                return Result(key, *measure(lambda: b.setup(param), repeat=repeat), baseline.get(key))
+
+            r = sorted((result() for _ in range(samples)), key=lambda x: x.relative)[samples // 2]
+
+            for _ in range(retries):
+                if r.ratio is None or r.ratio <= 1. + threshold:
+                    break
+
+                r = min(r, result(), key=lambda x: x.ratio)
+
+            report.results.append(r)
+
+    return report
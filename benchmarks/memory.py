@@ -0,0 +1,104 @@
+"""
+Measure the memory taken by DSL nodes.
+
+.. code-block:: bash
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory --size 100000
+
+Prints the number of bytes allocated per node while building graphs out of every node kind, as reported by
+:mod:`tracemalloc` (values referenced by the nodes are allocated before the measurement starts).
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from typing import Callable, List, Tuple, Any
+
+from xmake.compiler import walk
+from xmake.dsl import Con, Var, With, Seq, Par, Map, Fil, Match, Case, Fun, Op
+
+
+def _graph_con(items: List[Any]) -> Op:
+    return Par(*[Con(x) for x in items])
+
+
+def _graph_var(items: List[Any]) -> Op:
+    return Par(*[Var('x') for _ in items])
+
+
+def _graph_eval(items: List[Any]) -> Op:
+    return Par(*[Var('x') + x for x in items])
+
+
+def _graph_with(items: List[Any]) -> Op:
+    return Par(*[With(Var('x'), x, Var('x')) for x in items])
+
+
+def _graph_seq(items: List[Any]) -> Op:
+    return Seq(*[Seq(x, x) for x in items])
+
+
+def _graph_map(items: List[Any]) -> Op:
+    return Par(*[Map(lambda y: y * x, Var('ys')) for x in items])
+
+
+def _graph_fil(items: List[Any]) -> Op:
+    return Par(*[Fil(lambda y: y > x, Var('ys')) for x in items])
+
+
+def _graph_match(items: List[Any]) -> Op:
+    return Par(*[Match(Var('x'), lambda m: [Case(m == x, x), Case(True, m)]) for x in items])
+
+
+def _graph_fun(items: List[Any]) -> Op:
+    return Par(*[Fun(lambda a: a + x)(x) for x in items])
+
+
+GRAPHS: List[Tuple[str, Callable[[List[Any]], Op]]] = [
+    ('con', _graph_con),
+    ('var', _graph_var),
+    ('eval', _graph_eval),
+    ('with', _graph_with),
+    ('seq', _graph_seq),
+    ('map', _graph_map),
+    ('fil', _graph_fil),
+    ('match', _graph_match),
+    ('fun', _graph_fun),
+]
+
+
+def measure(build: Callable[[List[Any]], Op], size: int) -> Tuple[int, float]:
+    """:return: the number of nodes in the graph and the bytes allocated per node"""
+    items = [x + 1000 for x in range(size)]
+
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        root = build(items)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    nodes = sum(1 for _ in walk(root))
+
+    return nodes, (after - before) / nodes
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.memory')
+    parser.add_argument('--size', type=int, default=10000)
+
+    ns = parser.parse_args(args)
+
+    for name, build in GRAPHS:
+        nodes, per_node = measure(build, ns.size)
+        print(f'{name:<10} {nodes:>10} nodes {per_node:>10.1f} bytes/node')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
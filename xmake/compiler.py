@@ -0,0 +1,397 @@
+"""
+Ahead-of-time passes over an op tree.
+
+A pass is a function called on every node of the tree bottom-up (children first); it returns either the node itself
+or a replacement. The original tree is never modified: a node is copied as soon as any of its children is replaced,
+so the same tree can be executed as-is, compiled again or shared between graphs.
+
+.. code-block:: python
+    :linenos:
+
+    Executor().execute(compile_op(root))
+    # or
+    Executor(compile=True).execute(root)
+"""
+import copy
+from typing import Callable, List, Dict, Any, Optional, Tuple, Set
+
+from xmake.dsl import Op, Case, Seq, Match, Fil, Con, Var, With, Fun, Map, Iter, Reduce, Pipe, Call, Eval, _slot_names
+
+Node = Any
+Pass = Callable[[Op], Op]
+
+
+def _visit(x: Any, fn: Pass, memo: Dict[int, Any], descend: Optional[Callable[[Node], bool]] = None) -> Any:
+    if isinstance(x, (Op, Case)):
+        key = id(x)
+
+        if key in memo:
+            return memo[key]
+
+        r = _rebuild(x, fn, memo, descend) if descend is None or descend(x) else x
+
+        if isinstance(r, Op):
+            r = fn(r)
+
+        memo[key] = r
+        return r
+    elif isinstance(x, (list, tuple)):
+        # continuations precomputed by ``expand`` share the lists of their parents
+        key = id(x)
+
+        if key in memo:
+            return memo[key]
+
+        items = [_visit(y, fn, memo, descend) for y in x]
+
+        if all(a is b for a, b in zip(items, x)):
+            r = x
+        else:
+            r = items if isinstance(x, list) else tuple(items)
+
+        memo[key] = r
+        return r
+    else:
+        return x
+
+
+def _rebuild(x: Node, fn: Pass, memo: Dict[int, Any], descend: Optional[Callable[[Node], bool]]) -> Node:
+    changes = {}
+
+    for k, v in children(x).items():
+        nv = _visit(v, fn, memo, descend)
+
+        if nv is not v:
+            changes[k] = nv
+
+    return _replaced(x, changes)
+
+
+def _replaced(x: Node, changes: Dict[str, Any]) -> Node:
+    if not changes:
+        return x
+
+    r = copy.copy(x)
+
+    for k, v in changes.items():
+        setattr(r, k, v)
+
+    return r
+
+
+def children(x: Node) -> Dict[str, Any]:
+    """Attributes of a node that may reference other nodes"""
+    r = {}
+
+    for k in _slot_names(type(x)):
+        try:
+            # bypass Operators.__getattr__
+            r[k] = object.__getattribute__(x, k)
+        except AttributeError:
+            pass
+
+    # subclasses without __slots__ (e.g. the docker ops)
+    r.update(getattr(x, '__dict__', {}))
+    r.pop('_loc', None)
+
+    return r
+
+
+def transform(op: Op, fn: Pass, descend: Optional[Callable[[Node], bool]] = None) -> Op:
+    """
+    Apply ``fn`` to every node of ``op`` bottom-up, returning the new root.
+
+    :param descend: if given, the children of the nodes for which it returns False are left untouched
+    """
+    return _visit(op, fn, {}, descend)
+
+
+def walk(op: Op):
+    """Iterate over every node reachable from ``op`` once, parents first"""
+    seen = set()
+    stack = [op]
+
+    while stack:
+        x = stack.pop()
+
+        if isinstance(x, (list, tuple)):
+            stack.extend(reversed(x))
+            continue
+
+        if not isinstance(x, (Op, Case)) or id(x) in seen:
+            continue
+
+        seen.add(id(x))
+
+        if isinstance(x, Op):
+            yield x
+
+        stack.extend(reversed(list(children(x).values())))
+
+
+def binds(x: Node) -> List[str]:
+    """Names of the variables a node pushes to the context of (some of) its children"""
+    if isinstance(x, With):
+        return [v.name for v in x.vars]
+    elif isinstance(x, Fun):
+        return [v.name for v in x.args]
+    elif isinstance(x, (Match, Iter)):
+        return [x.map.name]
+    elif isinstance(x, (Map, Fil)):
+        return [x.target.name]
+    else:
+        return []
+
+
+def scope(x: Node, attr: str) -> Optional[List[str]]:
+    """
+    Names of the variables ``x`` pushes to the context of its child ``attr``, in the order they are pushed.
+
+    :return: None if ``attr`` declares the variables instead of reading them
+    """
+    if isinstance(x, With):
+        declared, bound, names = ('vars',), ('map_op',), [v.name for v in x.vars]
+    elif isinstance(x, Fun):
+        declared, bound, names = ('args',), ('body',), [v.name for v in x.args]
+    elif isinstance(x, Match):
+        declared, bound, names = ('map',), ('cases', 'chain'), [x.map.name]
+    elif isinstance(x, Iter):
+        declared, bound, names = ('map',), ('next_op', 'map_op'), [x.map.name]
+    elif isinstance(x, Map):
+        declared, bound, names = ('target',), ('map',), [x.target.name]
+    elif isinstance(x, Fil):
+        declared, bound, names = ('target',), ('filter', 'pair'), [x.target.name]
+    elif isinstance(x, Reduce):
+        declared, bound, names = ('left', 'right'), ('body',), [x.left.name, x.right.name]
+    else:
+        return []
+
+    if attr in declared:
+        return None
+    elif attr in bound:
+        return names
+    else:
+        return []
+
+
+class _Dynamic(Exception):
+    pass
+
+
+def _reads(x: Any, memo: Dict[int, Set[str]]) -> Set[str]:
+    if isinstance(x, Var):
+        return {x.name}
+    elif isinstance(x, (list, tuple)):
+        return set().union(*(_reads(y, memo) for y in x))
+    elif not isinstance(x, (Op, Case)):
+        return set()
+
+    # the ops executed are computed by the graph
+    if isinstance(x, Call) or (isinstance(x, Eval) and isinstance(x.body, Op)):
+        raise _Dynamic()
+
+    key = id(x)
+
+    if key not in memo:
+        r = set()
+
+        for k, v in children(x).items():
+            names = scope(x, k)
+
+            if names is not None:
+                r |= _reads(v, memo) - set(names)
+
+        memo[key] = r
+
+    return memo[key]
+
+
+def reads(op: Op) -> Optional[Set[str]]:
+    """
+    Names of the variables ``op`` reads from the context it is executed in.
+
+    :return: None if they are only known once executed, as ``op`` calls functions or evaluates ops
+    """
+    try:
+        return _reads(op, {})
+    except _Dynamic:
+        return None
+
+
+Stack = Tuple[str, ...]
+
+
+def _resolve(x: Any, stack: Stack, memo: Dict[Tuple[int, Stack], Any]) -> Any:
+    if isinstance(x, Var):
+        slot = len(stack) - 1 - stack.index(x.name) if x.name in stack else None
+        return x if slot == x.slot else x._replace(slot=slot)
+    elif isinstance(x, (Op, Case, list, tuple)):
+        # a shared node is resolved once per distinct scope it is reachable from
+        key = id(x), stack
+
+        if key in memo:
+            return memo[key]
+
+        if isinstance(x, (list, tuple)):
+            items = [_resolve(y, stack, memo) for y in x]
+
+            if all(a is b for a, b in zip(items, x)):
+                r = x
+            else:
+                r = items if isinstance(x, list) else tuple(items)
+        else:
+            changes = {}
+
+            for k, v in children(x).items():
+                names = scope(x, k)
+
+                if names is None:
+                    continue
+
+                # the body of a function is executed in the context of the call
+                inner = () if isinstance(x, Fun) and k == 'body' else stack
+
+                for name in names:
+                    inner = tuple(y for y in inner if y != name) + (name,)
+
+                nv = _resolve(v, inner, memo)
+
+                if nv is not v:
+                    changes[k] = nv
+
+            r = _replaced(x, changes)
+
+        memo[key] = r
+        return r
+    else:
+        return x
+
+
+def resolve(op: Op) -> Op:
+    """
+    Assign every :class:`xmake.dsl.Var` read in the scope of its binder (``With``, ``Fun``, ``Match``, ``Iter``,
+    ``Map``, ``Fil`` or ``Reduce``) the position of its mapping in the context, counted from the last one pushed.
+
+    The position follows :meth:`xmake.dsl.Ctx.push`: the bindings pushed on the way from the binder to the variable
+    are known ahead of time and a name is mapped at most once. The variables bound outside of ``op`` or by the caller
+    of a function are left to be looked up by name.
+    """
+    return _resolve(op, (), {})
+
+
+def substitute(op: Op, name: str, value: Op) -> Op:
+    """
+    Replace the free occurrences of ``Var(name)`` in ``op`` with ``value``.
+
+    Nodes that rebind ``name`` are kept as they are (together with the parts evaluated outside of the new binding).
+    """
+
+    def replace(x: Op) -> Op:
+        if isinstance(x, Var) and x.name == name:
+            return value
+        return x
+
+    return transform(op, replace, descend=lambda x: name not in binds(x))
+
+
+def _fold_match(op: Match) -> Op:
+    if not isinstance(op.value_op, Con):
+        return op
+
+    for start, case in enumerate(op.cases):
+        test = transform(substitute(case.match_op, op.map.name, op.value_op), fold)
+
+        if not isinstance(test, Con):
+            # the remaining cases can only be decided at runtime
+            return op if start == 0 else op._sliced(start)
+        elif test.value:
+            # the scrutinee stays bound, the branch may still refer to it
+            return With._make(op._loc, vars=[op.map], vals=[op.value_op], map_op=case.map_op)
+    else:
+        # let the executor raise `unmatched` with the context of the node
+        return op
+
+
+def fold(op: Op) -> Op:
+    """
+    Evaluate the side-effect free nodes with constant dependencies (see :meth:`xmake.dsl.Op.fold`) and replace
+    a :class:`xmake.dsl.Match` over a constant value with the branch it selects.
+    """
+    if isinstance(op, Match):
+        return _fold_match(op)
+    else:
+        return op.fold()
+
+
+def _windows(*windows: Optional[int]) -> Optional[int]:
+    windows = [x for x in windows if x is not None]
+    return min(windows) if len(windows) else None
+
+
+def fuse(op: Op) -> Op:
+    """
+    Fuse a :class:`xmake.dsl.Map` or :class:`xmake.dsl.Fil` over the result of another one into a
+    :class:`xmake.dsl.Pipe`. The smallest of the windows of the fused nodes applies to the pipe.
+
+    Experimental and not among :data:`DEFAULT_PASSES`: it lowers the memory held by the intermediate lists, but a pipe
+    still schedules a job per item and stage, so it does not lower the latency of the pipeline. Pass it to
+    :func:`compile_op` explicitly.
+    """
+    if not isinstance(op, (Map, Fil)):
+        return op
+
+    it = op.iter
+    stage = op._replace(iter=None)
+
+    if isinstance(it, Pipe):
+        return Pipe._make(op._loc, stages=it.stages + [stage], iter=it.iter, window=_windows(it.window, op.window))
+    elif isinstance(it, (Map, Fil)):
+        stages = [it._replace(iter=None), stage]
+        return Pipe._make(op._loc, stages=stages, iter=it.iter, window=_windows(it.window, op.window))
+    else:
+        return op
+
+
+def expand(op: Op) -> Op:
+    """
+    Precompute the continuations that :class:`xmake.dsl.Seq`, :class:`xmake.dsl.Match` and :class:`xmake.dsl.Fil`
+    would otherwise build in ``post_dependencies`` when first executed.
+
+    Everything that depends on runtime values (``Map`` elements, ``Eval`` results, ``Iter`` aggregators) is still
+    expanded dynamically.
+    """
+    if isinstance(op, Seq) and op.rest is None and len(op.ops) - op.start > 1:
+        rest = None
+
+        for start in range(len(op.ops) - 1, op.start, -1):
+            rest = op._replace(start=start, rest=rest)
+
+        return op._replace(rest=rest)
+    elif isinstance(op, Match) and op.chain is None and op.table is None:
+        r = op._replace()
+        r.chain = r._chain()
+        return r
+    elif isinstance(op, Fil) and op.pair is None:
+        r = op._replace()
+        r.pair = r._pair()
+        return r
+    else:
+        return op
+
+
+DEFAULT_PASSES: List[Pass] = [
+    fold,
+    expand,
+]
+
+
+def compile_op(op: Op, passes: Optional[List[Pass]] = None) -> Op:
+    """
+    Resolve the variables of ``op`` (see :func:`resolve`), then apply ``passes`` (by default :data:`DEFAULT_PASSES`).
+    """
+    op = resolve(op)
+
+    for fn in DEFAULT_PASSES if passes is None else passes:
+        op = transform(op, fn)
+
+    return op
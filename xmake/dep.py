@@ -58,6 +58,19 @@ class Deps(Generic[JobID]):
 
         self._maybe_free(job)
 
+    def redirect(self, job: JobID, new: JobID):
+        """Make everything waiting for ``job`` wait for ``new`` instead; ``new`` must not be done yet"""
+        waiters = self.deps_rev.pop(job, set())
+
+        for waiter in waiters:
+            self.deps[waiter].remove(job)
+            self.deps[waiter].add(new)
+
+        if new not in self.deps_rev:
+            self.deps_rev[new] = set()
+
+        self.deps_rev[new].update(waiters)
+
     def peek(self) -> Optional[JobID]:
         if len(self.pending):
             return self.pending[0]
@@ -101,6 +114,31 @@ class KeyedDeps(Generic[JobID, Job]):
     def peek(self) -> Optional[JobID]:
         return self.deps.peek()
 
+    def redirect(self, job_id: JobID, new: Job) -> List[JobID]:
+        """
+        Make everything waiting for ``job_id`` wait for ``new`` instead.
+
+        :return: the jobs which now wait for ``new``
+        """
+        new_id = self.job_id_fun(new)
+
+        waiters = self.values_deps_rev.pop(job_id, set())
+
+        for waiter in waiters:
+            self.values_deps[waiter] = [new_id if x == job_id else x for x in self.values_deps[waiter]]
+
+        self.values.pop(job_id, None)
+        self.values[new_id] = new
+
+        if new_id not in self.values_deps_rev:
+            self.values_deps_rev[new_id] = set()
+
+        self.values_deps_rev[new_id].update(waiters)
+
+        self.deps.redirect(job_id, new_id)
+
+        return list(waiters)
+
     def _maybe_gc(self, job_id):
         if len(self.values_deps_rev[job_id]):
             return
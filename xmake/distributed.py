@@ -0,0 +1,337 @@
+"""
+Execute the jobs of a graph on worker processes over xrpc.
+
+The coordinator (:class:`DistributedExecutor`) holds the dependency graph and executes every job itself except the
+ones marked with :attr:`xmake.dsl.Op.remote` (the docker ops). As soon as such a job is ready it is pickled together
+with its context and sent to a :class:`Worker`, which executes it (and its dependencies) with a local
+:class:`xmake.executor.Executor` and replies with the result.
+
+.. code-block:: bash
+
+    python -m xmake.distributed udp://0.0.0.0:7483 --docker unix:///var/run/docker.sock
+
+.. code-block:: python
+    :linenos:
+
+    DistributedExecutor(workers=[
+        WorkerRef('udp://10.0.0.1:7483', docker='tcp://10.0.0.1:2375'),
+        WorkerRef('udp://10.0.0.2:7483', docker='tcp://10.0.0.2:2375'),
+    ]).execute(root)
+
+A job bound to a docker daemon (the ``docker`` variable of its context, or the daemon of its container with
+:class:`xmake.op.docker.DockerHosts`) is sent to a worker attached to that daemon, else to one attached to none, the
+other ones to any idle worker. With :class:`xmake.op.docker.DockerHosts` the daemon of a job is chosen by the
+coordinator, and the ops executed on every daemon are executed by it. A worker executes one job at a time. Jobs that
+can not be pickled are executed by the coordinator. Only the bindings read by a job are sent with it, and the requests
+and replies are sent in parts of :data:`CHUNK` bytes, as each has to fit into a datagram.
+"""
+import argparse
+import pickle
+import sys
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from queue import Queue
+from typing import Any, Dict, List, Optional, Deque, Tuple
+from uuid import uuid4
+
+from dataclasses import dataclass, field
+from xrpc.actor import run_server
+from xrpc.client import client_transport
+from xrpc.dsl import rpc, RPCType, signal
+from xrpc.error import TerminationException
+
+from xmake.compiler import reads, walk
+from xmake.dsl import Op, Var, Con, With, Ctx
+from xmake.error import ExecError
+from xmake.executor import Executor
+from xmake.op.docker import DockerOp, DockerHosts, tagged
+from xmake.runtime import JobRec, JobRecID
+
+
+CHUNK = 1 << 15
+"""Size of the parts of the requests and replies, which are base64-encoded into the datagrams"""
+
+
+class RemoteError(Exception):
+    """An exception raised by a worker that could not be sent back as-is"""
+
+    def __init__(self, reason: str, tb: str):
+        self.reason = reason
+        self.tb = tb
+        super().__init__(reason, tb)
+
+    def __str__(self):
+        return f'{self.reason}\n{self.tb}'
+
+
+def _read(job: Op, mappings: List[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+    """:return: the bindings of ``mappings`` read by ``job``, or all of them if they are only known once executed"""
+    names = reads(job)
+
+    if names is None:
+        return mappings
+
+    if any(isinstance(x, DockerOp) for x in walk(job)):
+        names.add('docker')
+
+    return [(n, v) for n, v in Ctx(mappings).compacted().mappings if n in names]
+
+
+def _bind(job: Op, mappings: List[Tuple[str, Any]]) -> Op:
+    """``job`` executed within ``mappings``"""
+    if not len(mappings):
+        return job
+
+    return With._make(
+        job._loc,
+        vars=[Var._make(None, name=n, slot=None) for n, _ in mappings],
+        vals=[Con._make(None, value=v) for _, v in mappings],
+        map_op=job
+    )
+
+
+class Worker:
+    """
+    Execute the jobs sent by a :class:`DistributedExecutor`; ``bindings`` override the variables of their context
+    (e.g. ``docker`` is the URL of the daemon as seen from the worker).
+    """
+
+    def __init__(self, bindings: Optional[Dict[str, Any]] = None):
+        self.bindings = bindings or {}
+        self.parts: Dict[str, Dict[int, bytes]] = {}
+        self.replies: Dict[str, bytes] = {}
+
+    @rpc(RPCType.Repliable)
+    def put(self, key: str, idx: int, chunk: bytes) -> bool:
+        """Receive the part ``idx`` of the request ``key``"""
+        self.parts.setdefault(key, {})[idx] = chunk
+        return True
+
+    @rpc(RPCType.Repliable)
+    def execute(self, key: str, chunk: bytes) -> bytes:
+        """Execute the request ``key`` ending with ``chunk``; :return: the first part of the reply"""
+        parts = self.parts.pop(key, {})
+        reply = self._execute(b''.join(parts[x] for x in sorted(parts)) + chunk)
+
+        if len(reply) >= CHUNK:
+            self.replies[key] = reply
+
+        return reply[:CHUNK]
+
+    @rpc(RPCType.Repliable)
+    def get(self, key: str, idx: int) -> bytes:
+        """:return: the part ``idx`` of the reply ``key``, shorter than :data:`CHUNK` if it is the last one"""
+        r = self.replies.get(key, b'')[idx * CHUNK:(idx + 1) * CHUNK]
+
+        if len(r) < CHUNK:
+            self.replies.pop(key, None)
+
+        return r
+
+    def _execute(self, payload: bytes) -> bytes:
+        try:
+            job, mappings = pickle.loads(payload)
+            mappings = [(n, v) for n, v in mappings if n not in self.bindings] + list(self.bindings.items())
+
+            r = True, Executor().execute(_bind(job, mappings))
+        except ExecError as e:
+            r = False, e.e
+        except Exception as e:
+            r = False, e
+
+        try:
+            return pickle.dumps(r)
+        except Exception:
+            ok, x = r
+
+            if ok:
+                e = RemoteError(f'Could not pickle the result `{x!r}`', traceback.format_exc())
+            else:
+                e = RemoteError(repr(x), ''.join(traceback.format_exception(type(x), x, x.__traceback__)))
+
+            return pickle.dumps((False, e))
+
+    @signal()
+    def exit(self) -> bool:
+        raise TerminationException()
+
+
+def run_worker(url: str, bindings: Optional[Dict[str, Any]] = None):
+    """Serve a :class:`Worker` at ``url`` until terminated by a signal"""
+    run_server(Worker, Worker(bindings), {'default': url})
+
+
+@dataclass
+class WorkerRef:
+    url: str
+    """xrpc URL of the worker"""
+    docker: Optional[str] = None
+    """URL of the docker daemon the worker is attached to, as used in the context of the jobs"""
+    busy: bool = field(default=False, repr=False)
+
+    def call(self, payload: bytes) -> bytes:
+        key = uuid4().hex
+        chunks = [payload[i:i + CHUNK] for i in range(0, len(payload), CHUNK)] or [b'']
+
+        # horz=False retries the requests sent before the worker had started with a new key
+        with client_transport(Worker, dest=self.url, timeout_total=None, horz=False) as w:
+            for idx, chunk in enumerate(chunks[:-1]):
+                w.put(key, idx, chunk)
+
+            r = [w.execute(key, chunks[-1])]
+
+            while len(r[-1]) == CHUNK:
+                r.append(w.get(key, len(r)))
+
+            return b''.join(r)
+
+
+@dataclass()
+class DistributedExecutor(Executor):
+    """
+    Execute the jobs marked with :attr:`xmake.dsl.Op.remote` on ``workers``, see :mod:`xmake.distributed`
+    """
+    workers: List[WorkerRef] = field(default_factory=list)
+    backlog: Deque[Tuple[JobRec, bytes]] = field(default_factory=deque, repr=False)
+    done: 'Queue[Tuple[JobRec, WorkerRef, Future]]' = field(default_factory=Queue, repr=False)
+    pool: Optional[ThreadPoolExecutor] = field(default=None, repr=False)
+    hosts: Dict[JobRecID, str] = field(default_factory=dict, repr=False)
+    """The daemons of :class:`xmake.op.docker.DockerHosts` chosen for the jobs sent to the workers"""
+
+    def execute(self, root: Op):
+        # the replies to the jobs of a failed execution are never waited for
+        self.done = Queue()
+        self.pool = ThreadPoolExecutor(max_workers=max(len(self.workers), 1))
+
+        for worker in self.workers:
+            worker.busy = False
+
+        try:
+            return super().execute(root)
+        finally:
+            self.pool.shutdown(wait=False)
+            self.backlog.clear()
+            self.hosts.clear()
+
+    def locality(self, job_rec: JobRec) -> Optional[str]:
+        """:return: the docker daemon ``job_rec`` is bound to, if any"""
+        if job_rec.id in self.hosts:
+            return self.hosts[job_rec.id]
+
+        if isinstance(job_rec.job, DockerOp) and job_rec.job.host() is not None:
+            return job_rec.job.host()
+
+        try:
+            r = job_rec.ctx.get('docker')
+        except KeyError:
+            return None
+
+        return r if isinstance(r, str) else None
+
+    def place(self, job_rec: JobRec) -> Optional[WorkerRef]:
+        """:return: an idle worker to execute ``job_rec``, if any"""
+        for worker in self.candidates(self.locality(job_rec)):
+            if not worker.busy:
+                return worker
+
+        return None
+
+    def candidates(self, docker: Optional[str]) -> List[WorkerRef]:
+        """
+        :return: the workers able to execute the jobs bound to the daemon ``docker``: the ones attached to it, else the
+            ones attached to none (a worker attached to another daemon would replace it with its own)
+        """
+        if docker is None:
+            return self.workers
+
+        return [x for x in self.workers if x.docker == docker] or [x for x in self.workers if x.docker is None]
+
+    def offload(self, job_rec: JobRec) -> bool:
+        job, mappings = job_rec.job, _read(job_rec.job, job_rec.ctx.mappings)
+
+        try:
+            hosts = job_rec.ctx.get('docker')
+        except KeyError:
+            hosts = None
+
+        host = None
+
+        if isinstance(hosts, DockerHosts) and isinstance(job, DockerOp):
+            # executed on every daemon by the coordinator
+            if job.host() is None and job.broadcast:
+                return False
+
+            # placed here, as the copies of the binding sent to the workers would not share their load
+            host = job.host() or hosts.place(job)
+            mappings = [(n, v) for n, v in mappings if n != 'docker'] + [('docker', host)]
+
+        if not len(self.candidates(host or self.locality(job_rec))):
+            return False
+
+        try:
+            payload = pickle.dumps((job, mappings))
+        except Exception:
+            return False
+
+        if host is not None:
+            hosts.assign(job)
+            self.hosts[job_rec.id] = host
+
+        self.backlog.append((job_rec, payload))
+        self._dispatch()
+
+        return True
+
+    def _dispatch(self):
+        for _ in range(len(self.backlog)):
+            job_rec, payload = self.backlog.popleft()
+            worker = self.place(job_rec)
+
+            if worker is None:
+                self.backlog.append((job_rec, payload))
+                continue
+
+            worker.busy = True
+
+            fut = self.pool.submit(worker.call, payload)
+            fut.add_done_callback(lambda f, job_rec=job_rec, worker=worker: self.done.put((job_rec, worker, f)))
+
+    def wait(self):
+        if not len(self.backlog) and all(not x.busy for x in self.workers):
+            super().wait()
+
+        job_rec, worker, fut = self.done.get()
+
+        worker.busy = False
+        host = self.hosts.pop(job_rec.id, None)
+
+        try:
+            ok, ret = pickle.loads(fut.result())
+        except Exception as e:
+            raise ExecError(job_rec, [], e)
+
+        if not ok:
+            raise ExecError(job_rec, [], ret)
+
+        if host is not None:
+            ret = tagged(ret, host)
+
+        self.complete(job_rec, ret)
+        self._dispatch()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='xmake.distributed')
+    parser.add_argument('url', help='xrpc URL to serve the worker at, e.g. udp://0.0.0.0:7483')
+    parser.add_argument('--docker', default=None, help='URL of the docker daemon the jobs are executed with')
+
+    ns = parser.parse_args(args)
+
+    run_worker(ns.url, {'docker': ns.docker} if ns.docker else None)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
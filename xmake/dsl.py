@@ -1,10 +1,12 @@
+import copy
 import inspect
 import logging
+import operator
 import string
 from collections import deque
 
-from dataclasses import dataclass, field
-from typing import List, Any, Tuple, Callable, Union, Optional, TypeVar
+from dataclasses import dataclass, field, FrozenInstanceError
+from typing import List, Any, Tuple, Callable, Union, Optional, TypeVar, Dict, Iterable, FrozenSet
 
 from xmake.util import _get_caller, _enclosed
 
@@ -34,10 +36,10 @@ def _wr(x: WT):
         for caller_idx in [3]:
             # caller_idx = 3
 
-            caller = _get_caller(caller_idx)[0]
+            caller = _get_caller(caller_idx)
 
-            caller_locals = caller.f_locals
-            caller_globals = caller.f_globals
+            caller_locals = caller.frame.f_locals
+            caller_globals = caller.frame.f_globals
             fn_freevars = x.__code__.co_freevars
 
             # print('____________________________________________________________')
@@ -56,15 +58,25 @@ def _wr(x: WT):
             except KeyError:
                 continue
             else:
-                return Eval(Eval(
-                    *freevars_values,
-                    _enclosed(x, caller_globals),
-                )._with_loc(Loc.from_frame_idx(4)), wrap=True)._with_loc(Loc.from_frame_idx(4))
+                # both wrappers point at the line that passed the lambda; built without running the constructors
+                loc = Loc.from_frame(caller)
+
+                return Eval._make(
+                    loc,
+                    args=[],
+                    body=Eval._make(
+                        loc,
+                        args=[v if isinstance(v, Op) else Con._const(v) for v in freevars_values],
+                        body=_enclosed(x, caller_globals),
+                        wrap=False,
+                    ),
+                    wrap=True,
+                )
         else:
             raise KeyError('None')
 
     else:
-        return Con(x)
+        return Con._const(x)
 
 
 def _check_callable(fn: Callable):
@@ -82,12 +94,27 @@ def _assert_callable(fn: Callable):
     return spec.args
 
 
+CTX_COMPACT_MIN = 32
+"""Length of the contexts below which the shadowed mappings are kept on tail calls, see :meth:`Ctx.compacted`"""
+
+
 @dataclass()
 class Ctx:
     mappings: List[Tuple[str, Any]] = field(default_factory=list)
 
-    def get(self, n: str):
-        for cn, cv in self.mappings[::-1]:
+    def get(self, n: str, slot: Optional[int] = None):
+        """
+        :param slot: the expected position of the mapping counting from the last one pushed (as if the shadowed
+                     mappings had been dropped); the context is only scanned when the mapping found there has another
+                     name, which the shadowed mappings of ``n`` never are since they come before the last one
+        """
+        if slot is not None and slot < len(self.mappings):
+            cn, cv = self.mappings[-1 - slot]
+
+            if cn == n:
+                return cv
+
+        for cn, cv in reversed(self.mappings):
             if cn == n:
                 return cv
         else:
@@ -96,6 +123,27 @@ class Ctx:
     def push(self, n: str, val: Any) -> 'Ctx':
         return Ctx(self.mappings + [(n, val)])
 
+    def compacted(self) -> 'Ctx':
+        """
+        :return: the context without the shadowed mappings; they are never looked up again (the context is not passed
+                 back to the parent jobs), so dropping them on tail calls keeps the context of recursion from growing
+        """
+        names = {x[0] for x in self.mappings}
+
+        if len(names) == len(self.mappings):
+            return self
+
+        r = []
+
+        for x in reversed(self.mappings):
+            if x[0] in names:
+                names.discard(x[0])
+                r.append(x)
+
+        r.reverse()
+
+        return Ctx(r)
+
     def pop(self, n: str) -> Any:
         idxs = range(len(self.mappings) - 1, -1, -1)
         for idx, (cn, cv) in ((idx, self.mappings[idx]) for idx in idxs):
@@ -105,8 +153,14 @@ class Ctx:
             raise KeyError(n)
 
 
+_LOCS: Dict[Tuple[str, int], 'Loc'] = {}
+
+
 @dataclass
 class Loc:
+    """Location of a node in the source code; the instances are shared by all the nodes built at the same line"""
+    __slots__ = ('filename', 'lineno')
+
     filename: str
     lineno: int
 
@@ -122,7 +176,17 @@ class Loc:
 
     @classmethod
     def from_frame(cls, fr: inspect.FrameInfo):
-        return Loc(fr.filename, fr.lineno)
+        return cls.intern(fr.filename, fr.lineno)
+
+    @classmethod
+    def intern(cls, filename: str, lineno: int) -> 'Loc':
+        key = filename, lineno
+
+        try:
+            return _LOCS[key]
+        except KeyError:
+            r = _LOCS[key] = cls(filename, lineno)
+            return r
 
 
 class OpError(Exception):
@@ -158,67 +222,136 @@ class OpError(Exception):
 
 
 class Operators:
+    __slots__ = ()
+
     def __call__(self, *args: 'WT'):
         return Call(self, *args)
 
     def __getattr__(self, item: 'WT'):
-        return GetAttr(self, item)
+        if item.startswith('__') and item.endswith('__') or item in _slot_names(type(self)):
+            # protocols looked up by copy, pickle, etc. (and slots not set yet) must not be mistaken for DSL
+            # attribute access
+            raise AttributeError(item)
+
+        return GetAttr(self, item).fold()
 
     def __getitem__(self, item: 'WT'):
-        return GetItem(self, item)
+        return GetItem(self, item).fold()
+
+    def _binop(self, other: 'WT', fn: Callable[[Any, Any], Any]):
+        return Eval(self, other, fn).fold()
 
     # math
 
     def __add__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x + y)
+        return self._binop(other, operator.add)
 
     def __sub__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x - y)
+        return self._binop(other, operator.sub)
 
     def __mul__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x * y)
+        return self._binop(other, operator.mul)
 
     def __truediv__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x / y)
+        return self._binop(other, operator.truediv)
 
     def __divmod__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: divmod(x, y))
+        return self._binop(other, divmod)
 
     # binary
 
     def __and__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x and y)
+        return And(self, other).fold()
 
     def __or__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x or y)
+        return Or(self, other).fold()
 
     # sets
 
     def __contains__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: y in x)
+        return self._binop(other, operator.contains)
 
     # comparison
 
     def __le__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x <= y)
+        return self._binop(other, operator.le)
 
     def __lt__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x < y)
+        return self._binop(other, operator.lt)
 
     def __eq__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x == y)
+        return self._binop(other, operator.eq)
 
     def __gt__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x > y)
+        return self._binop(other, operator.gt)
 
     def __ge__(self, other: 'WT'):
-        return Eval(self, other, lambda x, y: x >= y)
+        return self._binop(other, operator.ge)
+
+
+PURE_FUNCTIONS = (
+    operator.add,
+    operator.sub,
+    operator.mul,
+    operator.truediv,
+    divmod,
+    operator.contains,
+    operator.le,
+    operator.lt,
+    operator.eq,
+    operator.gt,
+    operator.ge,
+)
+"""Eval bodies without side effects that may be evaluated ahead of time over constant arguments"""
+
+
+_SLOT_NAMES: Dict[type, FrozenSet[str]] = {}
+
+
+def _slot_names(cls: type) -> FrozenSet[str]:
+    try:
+        return _SLOT_NAMES[cls]
+    except KeyError:
+        names = set()
+
+        for base in cls.__mro__:
+            slots = base.__dict__.get('__slots__', ())
+            names.update([slots] if isinstance(slots, str) else slots)
+
+        r = _SLOT_NAMES[cls] = frozenset(names)
+        return r
 
 
 @dataclass(repr=False, eq=False)
 class Op(Operators):
-    def __post_init__(self):
-        fr = _get_caller(3)
+    __slots__ = ('_loc',)
+
+    tail = False
+    """
+    The result of the node is the result of its only post-dependency, see :meth:`Op.post_dependencies`.
+
+    The executor then replaces the node with that post-dependency (``post_execute`` is not called) so that
+    recursion in tail position does not keep the calling jobs alive.
+    """
+
+    remote = False
+    """
+    The node may be executed by another process together with its dependencies, see
+    :class:`xmake.distributed.DistributedExecutor`.
+    """
+
+    leaf = False
+    """
+    The node has neither dependencies nor post-dependencies, does not change the context and its result is the one of
+    ``context_execute``.
+
+    The executor then evaluates the node inline while scheduling the dependencies of its parent instead of running it
+    as a job of its own.
+    """
+
+    def __post_init__(self, depth: int = 3):
+        """:param depth: of the frame building the node, one more for every ``__post_init__`` of a subclass calling it"""
+        fr = _get_caller(depth)
 
         loc = Loc.from_frame(fr)
 
@@ -231,9 +364,54 @@ class Op(Operators):
         self._loc = loc
         return self
 
+    def _replace(self, **attrs: Any) -> 'Op':
+        """Shallow copy of the node keeping its location, without running the constructor"""
+        r = copy.copy(self)
+
+        for k, v in attrs.items():
+            setattr(r, k, v)
+
+        return r
+
+    @classmethod
+    def _make(cls, loc: Optional['Loc'], **attrs: Any) -> 'Op':
+        """Build a node at runtime or in a compiler pass; skips the constructor and the location capture"""
+        r = cls.__new__(cls)
+
+        for k, v in attrs.items():
+            setattr(r, k, v)
+
+        r._loc = loc
+
+        return r
+
     def __repr__(self) -> str:
         return f'{self.__class__.__name__}()'
 
+    def fold(self) -> 'Op':
+        """
+        :return: a :class:`Con` if the node can be evaluated ahead of time, otherwise the node itself
+        """
+        return self
+
+    def _fold_deps(self) -> 'Op':
+        deps = self.dependencies()
+
+        # a mutable value might change (or the evaluation have side effects) before the graph is executed
+        if not all(isinstance(x, Con) and _immutable(x.value) for x in deps):
+            return self
+
+        try:
+            value = self.execute(*[x.value for x in deps])
+        except Exception:
+            # keep the node so that the error is raised with its context at runtime
+            return self
+
+        if not _immutable(value):
+            return self
+
+        return Con._make(self._loc, value=value)
+
     @property
     def logger(self):
         return logging.getLogger(self.__module__ + '.' + self.__class__.__name__)
@@ -321,14 +499,18 @@ class GetAttr(Op):
     def __repr__(self) -> str:
         return f'{self.__class__.__name__}({repr(self.value)}, {repr(self.name)})'
 
+    __slots__ = ('value', 'name', 'default')
+
     value: Op
     name: Op
-    default: Union[NoVal, Op] = NO_VALUE
+    default: Union[NoVal, Op]
 
     def __init__(self, value: WT, name: WT, default: Union[NoVal, WT] = NO_VALUE):
         self.value = _wr(value)
         self.name = _wr(name)
-        self.default = _wr(default)
+        self.default = default if default is NO_VALUE else _wr(default)
+
+        self.__post_init__()
 
     def dependencies(self) -> List['Op']:
         default = [] if self.default is NO_VALUE else [self.default]
@@ -349,9 +531,14 @@ class GetAttr(Op):
             else:
                 return getattr(value_res, name_res)
 
+    def fold(self) -> 'Op':
+        return self._fold_deps()
+
 
 @dataclass(repr=False, eq=False)
 class GetItem(Op):
+    __slots__ = ('value', 'key')
+
     value: Op
     key: Op
 
@@ -359,15 +546,40 @@ class GetItem(Op):
         self.value = _wr(value)
         self.key = _wr(key)
 
+        self.__post_init__()
+
     def dependencies(self) -> List['Op']:
         return [self.value, self.key]
 
     def execute(self, value_res: Any, key_res: Any, *default: Any) -> TRes:
         return value_res[key_res]
 
+    def fold(self) -> 'Op':
+        return self._fold_deps()
+
+
+CONST_TYPES = (type(None), bool, int, str)
+"""Immutable types of the values which :class:`Con` nodes are shared by :func:`_wr`"""
+CONST_CACHE_SIZE = 4096
+CONST_STR_LEN = 64
+
+_CONST_CACHE: Dict[Tuple[type, Any], 'Con'] = {}
+
+
+def _immutable(value: Any) -> bool:
+    """:return: True if ``value`` is one of ``CONST_TYPES`` or a tuple of them"""
+    if isinstance(value, tuple):
+        return all(_immutable(x) for x in value)
+
+    return isinstance(value, CONST_TYPES)
+
 
 @dataclass(repr=False, eq=False)
 class Con(Op):
+    leaf = True
+
+    __slots__ = ('value',)
+
     value: Any
 
     def __repr__(self):
@@ -376,23 +588,82 @@ class Con(Op):
             vr = vr[:10] + '...'
         return f'Con({vr})'
 
+    @classmethod
+    def _const(cls, value: Any) -> 'Con':
+        """
+        A node without a location for a value wrapped by :func:`_wr`; the nodes of the common immutable values are
+        shared by all the graphs, so they can not be changed (see :meth:`_with_loc`).
+        """
+        kind = type(value)
+
+        if kind not in CONST_TYPES or (kind is str and len(value) > CONST_STR_LEN):
+            return cls._make(None, value=value)
+
+        # bool is a subclass of int, and True == 1
+        key = kind, value
+
+        try:
+            return _CONST_CACHE[key]
+        except KeyError:
+            if len(_CONST_CACHE) >= CONST_CACHE_SIZE:
+                return cls._make(None, value=value)
+
+            r = _CONST_CACHE[key] = _SharedCon.__new__(_SharedCon)
+            object.__setattr__(r, 'value', value)
+            object.__setattr__(r, '_loc', None)
+
+            return r
+
     def execute(self, *args: Any) -> TRes:
         return self.value
 
 
+class _SharedCon(Con):
+    """A node of ``_CONST_CACHE``: it can not be changed, and its copies are :class:`Con` nodes that can"""
+    __slots__ = ()
+
+    def __setattr__(self, key: str, value: Any):
+        raise FrozenInstanceError(f'cannot assign to field {key!r} of the shared {self!r}')
+
+    def __copy__(self) -> Con:
+        return Con._make(self._loc, value=self.value)
+
+    def __reduce__(self):
+        return Con._const, (self.value,)
+
+    def _with_loc(self, loc: 'Loc') -> 'Op':
+        return Con._make(loc, value=self.value)
+
+
 VarName = str
 
 
-@dataclass(repr=False, eq=False)
 class Var(Op):
+    """
+    Read a variable from the context.
+
+    ``slot`` is assigned by :func:`xmake.compiler.resolve` to the variables read in the scope of their binder
+    (see :meth:`Ctx.get`); the others (e.g. the implicit ``docker`` binding) are looked up by name.
+    """
+    leaf = True
+
+    __slots__ = ('name', 'slot')
+
     name: VarName
+    slot: Optional[int]
+
+    def __init__(self, name: VarName):
+        self.name = name
+        self.slot = None
+
+        self.__post_init__()
 
     def __repr__(self):
         return f'Var({self.name})'
 
     def context_execute(self, ctx: Ctx, *args: Any) -> Tuple[Ctx, TRes]:
         try:
-            return ctx, ctx.get(self.name)
+            return ctx, ctx.get(self.name, self.slot)
         except KeyError:
             # can this operation return a function that, given
             raise OpError(self, f'No variable mapping found `{self.name}`')
@@ -452,9 +723,11 @@ class Log(Op):
 
     """
 
+    __slots__ = ('node', 'name', 'msg')
+
     node: Op
-    name: str = field(default_factory=lambda: __name__)
-    msg: Optional[str] = None
+    name: str
+    msg: Optional[str]
 
     def __init__(self, *args: WT):
         guessed_name = inspect.getmodule(_get_caller(2)[0]).__name__
@@ -498,6 +771,8 @@ class Log(Op):
 
 @dataclass(repr=False, eq=False)
 class Err(Op):
+    __slots__ = ('msg', 'args')
+
     msg: Optional[str]
     args: List[Op]
 
@@ -547,9 +822,13 @@ def _map_eval_args(iter_obj):
 
 @dataclass(repr=False, eq=False)
 class Eval(Op):
+    tail = True
+
+    __slots__ = ('args', 'body', 'wrap')
+
     args: List[Op]
     body: Union[str, Callable, Op]
-    wrap: bool = False
+    wrap: bool
 
     def __init__(self, *args: Union[str, Callable, Op], wrap=False):
         body = args[-1]
@@ -590,6 +869,13 @@ class Eval(Op):
         else:
             raise NotImplementedError(self.body)
 
+    def fold(self) -> 'Op':
+        # bodies may be unhashable (ops, enclosed lambdas)
+        if any(self.body is x for x in PURE_FUNCTIONS):
+            return self._fold_deps()
+        else:
+            return self
+
     def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
         if isinstance(self.body, Op):
             if self.wrap:
@@ -613,6 +899,8 @@ class Eval(Op):
 
 @dataclass(repr=False, eq=False)
 class Iter(Op):
+    __slots__ = ('map', 'aggregator', 'next_op', 'map_op')
+
     map: Var
     aggregator: Op
     next_op: Op
@@ -623,7 +911,7 @@ class Iter(Op):
 
     def dependencies(self) -> List['Op']:
         # how do we pass an aggregator to the dependency ?
-        return [With(self.map, self.aggregator, self.next_op)]
+        return [With._make(self._loc, vars=[self.map], vals=[self.aggregator], map_op=self.next_op)]
 
     def execute(self, rtn: Any) -> TRes:
         return rtn
@@ -635,8 +923,8 @@ class Iter(Op):
 
         if new_agg is not None:
             return [
-                Iter(self.map, Con(new_agg), self.next_op, self.map_op),
-                With(self.map, Con(item), self.map_op)
+                self._replace(aggregator=Con._make(self._loc, value=new_agg)),
+                With._make(self._loc, vars=[self.map], vals=[Con._make(self._loc, value=item)], map_op=self.map_op)
             ]
         else:
             return []
@@ -654,6 +942,10 @@ class Iter(Op):
 
 @dataclass(repr=False, eq=False)
 class With(Op):
+    tail = True
+
+    __slots__ = ('vars', 'vals', 'map_op')
+
     vars: List[Var]
     vals: List[Op]
     map_op: Op
@@ -727,14 +1019,17 @@ class With(Op):
 
     def context_post_execute(self, ctx: Ctx, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> \
             Tuple[Ctx, TPostRes]:
-        for var in self.vars:
-            ctx = ctx.pop(var.name)
+        # the shadowed mappings of a name bound twice might have been dropped already
+        for name in dict.fromkeys(var.name for var in self.vars):
+            ctx = ctx.pop(name)
 
         return ctx, post_result[0]
 
 
 @dataclass(repr=False, eq=False)
 class Case:
+    __slots__ = ('match_op', 'map_op')
+
     match_op: Op
     map_op: Op
 
@@ -746,10 +1041,62 @@ class Case:
         assert isinstance(self.map_op, Op), self.map_op
 
 
+@dataclass(repr=False, init=False)
+class Cases(Op):
+    """
+    Test ``cases[start:]`` one after another in the context set up by :class:`Match` and execute the first branch
+    which test is truthy.
+    """
+
+    tail = True
+
+    __slots__ = ('cases', 'start', 'rest')
+
+    cases: List[Case]
+    start: int
+    rest: Optional['Cases']
+
+    def dependencies(self) -> List['Op']:
+        return [self.cases[self.start].match_op]
+
+    def execute(self, val) -> TRes:
+        return val
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        if result:
+            return [self.cases[self.start].map_op]
+        elif self.rest is not None:
+            return [self.rest]
+        else:
+            return []
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        if len(post_result) == 0:
+            raise OpError(self, 'unmatched')
+        else:
+            return post_result[0]
+
+
+def _eq_key(map: Var, op: Op) -> Union[NoVal, Any]:
+    """:return: ``x`` if ``op`` is ``map == Con(x)`` or ``Con(x) == map``"""
+    if not isinstance(op, Eval) or op.body is not operator.eq:
+        return NO_VALUE
+
+    a, b = op.args
+
+    if isinstance(a, Con) and isinstance(b, Var):
+        a, b = b, a
+
+    if isinstance(a, Var) and a.name == map.name and isinstance(b, Con):
+        return b.value
+    else:
+        return NO_VALUE
+
+
 @dataclass(repr=False, init=False)
 class Match(Op):
     """
-    Pattern matching.
+    Pattern matching. The value is evaluated once and bound to the variable for all of the cases.
 
     .. code-block:: python
         :linenos:
@@ -767,10 +1114,21 @@ class Match(Op):
                 )
             ]
         )
+
+    If every test is an equality against a constant (``m == 'a'``), optionally followed by a ``Case(True, ...)``,
+    the branch is looked up in a dict instead of executing the tests one by one.
     """
+
+    tail = True
+
+    __slots__ = ('map', 'value_op', 'cases', 'table', 'default', 'chain')
+
     map: Var
     value_op: Op
     cases: List[Case]
+    table: Optional[Dict[Any, int]]
+    default: Optional[int]
+    chain: Optional[Cases]
 
     @classmethod
     def from_ext(cls, value: WT, fn: Callable):
@@ -800,6 +1158,8 @@ class Match(Op):
         self.map = _wr(map)
         self.value_op = _wr(value_op)
         self.cases = cases
+        self.table, self.default = self._table()
+        self.chain = None
 
         assert isinstance(self.map, Op), self.map
         assert isinstance(self.value_op, Op), self.value_op
@@ -809,25 +1169,187 @@ class Match(Op):
 
         self.__post_init__()
 
+    def _table(self) -> Tuple[Optional[Dict[Any, int]], Optional[int]]:
+        table = {}
+
+        for idx, case in enumerate(self.cases):
+            key = _eq_key(self.map, case.match_op)
+
+            if key is not NO_VALUE:
+                try:
+                    table.setdefault(key, idx)
+                except TypeError:
+                    return None, None
+            elif isinstance(case.match_op, Con):
+                if case.match_op.value:
+                    # the following cases are unreachable
+                    return table, idx
+            else:
+                return None, None
+
+        return table, None
+
+    def _chain(self) -> Optional[Cases]:
+        rest = None
+
+        for start in range(len(self.cases) - 1, -1, -1):
+            rest = Cases._make(self._loc, cases=self.cases, start=start, rest=rest)
+
+        return rest
+
+    def _sliced(self, start: int) -> 'Match':
+        r = self._replace(cases=self.cases[start:], chain=None)
+        r.table, r.default = r._table()
+        return r
+
     def dependencies(self) -> List['Op']:
-        return [With(self.map, self.value_op, self.cases[0].match_op)]
+        return [self.value_op]
 
-    def execute(self, val) -> TRes:
-        return val
+    def context_execute(self, ctx: Ctx, val: Any) -> Tuple[Ctx, TRes]:
+        return ctx.push(self.map.name, val), val
 
     def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
-        if result:
-            return [With(self.map, self.value_op, self.cases[0].map_op)._with_loc(self._loc)]
-        elif len(self.cases) > 1:
-            return [Match(self.map, self.value_op, *self.cases[1:])._with_loc(self._loc)]
-        else:
-            return []
+        if self.table is not None:
+            try:
+                idx = self.table.get(result, self.default)
+            except TypeError:
+                # unhashable values are tested one by one
+                pass
+            else:
+                return [] if idx is None else [self.cases[idx].map_op]
 
-    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        if self.chain is None:
+            self.chain = self._chain()
+
+        return [] if self.chain is None else [self.chain]
+
+    def context_post_execute(self, ctx: Ctx, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> \
+            Tuple[Ctx, TPostRes]:
         if len(post_result) == 0:
             raise OpError(self, 'unmatched')
+
+        return ctx.pop(self.map.name), post_result[0]
+
+
+@dataclass(repr=False, init=False)
+class And(Op):
+    """
+    Short-circuiting ``and``; ``right`` is only executed if ``left`` is truthy.
+
+    .. code-block:: python
+        :linenos:
+
+        Var('refresh') & ContainerList(filters={'label': 'xmake'})
+    """
+
+    tail = True
+
+    __slots__ = ('left', 'right')
+
+    left: Op
+    right: Op
+
+    def __init__(self, left: WT, right: WT):
+        self.left = _wr(left)
+        self.right = _wr(right)
+
+        self.__post_init__()
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({repr(self.left)}, {repr(self.right)})'
+
+    def fold(self) -> 'Op':
+        if isinstance(self.left, Con):
+            return self.right if self.left.value else self.left
         else:
-            return post_result[0]
+            return self
+
+    def dependencies(self) -> List['Op']:
+        return [self.left]
+
+    def execute(self, left: Any) -> TRes:
+        return left
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        return [self.right] if result else []
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        return post_result[0] if len(post_result) else execute_ret
+
+
+@dataclass(repr=False, init=False)
+class Or(And):
+    """
+    Short-circuiting ``or``; ``right`` is only executed if ``left`` is falsy.
+
+    .. code-block:: python
+        :linenos:
+
+        Var('cached') | ContainerList(filters={'label': 'xmake'})
+    """
+
+    __slots__ = ()
+
+    def fold(self) -> 'Op':
+        if isinstance(self.left, Con):
+            return self.left if self.left.value else self.right
+        else:
+            return self
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        return [] if result else [self.right]
+
+
+@dataclass(repr=False, init=False)
+class If(Op):
+    """
+    Conditional; only the selected branch is executed.
+
+    .. code-block:: python
+        :linenos:
+
+        If(
+            Var('force'),
+            ContainerRemove(Var('container')),
+            Log('kept', Var('container')),
+        )
+    """
+
+    tail = True
+
+    __slots__ = ('cond', 'then', 'otherwise')
+
+    cond: Op
+    then: Op
+    otherwise: Op
+
+    def __init__(self, cond: WT, then: WT, otherwise: WT = None):
+        self.cond = _wr(cond)
+        self.then = _wr(then)
+        self.otherwise = _wr(otherwise)
+
+        self.__post_init__()
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({repr(self.cond)}, {repr(self.then)}, {repr(self.otherwise)})'
+
+    def fold(self) -> 'Op':
+        if isinstance(self.cond, Con):
+            return self.then if self.cond.value else self.otherwise
+        else:
+            return self
+
+    def dependencies(self) -> List['Op']:
+        return [self.cond]
+
+    def execute(self, cond: Any) -> TRes:
+        return cond
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        return [self.then if result else self.otherwise]
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        return post_result[0]
 
 
 @dataclass(repr=False, init=False)
@@ -848,6 +1370,10 @@ class Fun(Op):
 
     """
 
+    leaf = True
+
+    __slots__ = ('args', 'body')
+
     args: List[Var]
     body: Op
 
@@ -902,8 +1428,12 @@ class Fun(Op):
 
 @dataclass(repr=False, init=False)
 class Call(Op):
+    tail = True
+
     # todo call is responsible for currying.!
 
+    __slots__ = ('fun', 'args')
+
     fun: Op
     args: List[Op]
 
@@ -963,7 +1493,11 @@ class Seq(Op):
         )
     """
 
+    __slots__ = ('ops', 'start', 'rest')
+
     ops: List[Op]
+    start: int
+    rest: Optional['Seq']
 
     def __init__(self, *ops: WT):
         wr_ops = []
@@ -972,42 +1506,61 @@ class Seq(Op):
             wr_ops.append(_wr(op))
 
         self.ops = wr_ops
+        self.start = 0
+        self.rest = None
 
         self.__post_init__()
 
     def __repr__(self) -> str:
-        r = ', '.join(str(x) for x in self.ops)
+        r = ', '.join(str(x) for x in self.ops[self.start:])
         return f'{self.__class__.__name__}({r})'
 
     def dependencies(self) -> List['Op']:
-        if len(self.ops):
-            return [self.ops[0]]
+        if len(self.ops) > self.start:
+            return [self.ops[self.start]]
         else:
             return []
 
     def execute(self, *ret: Any) -> TRes:
-        if len(self.ops):
+        if len(self.ops) > self.start:
             return ret[0]
         else:
             return None
 
     def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
-        if len(self.ops) > 1:
-            return [Seq(*self.ops[1:])]
+        if len(self.ops) - self.start > 1:
+            return [self.rest if self.rest is not None else self._replace(start=self.start + 1)]
         else:
             return []
 
     def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
-        if len(self.ops) > 1 and post_result[0] is not None:
+        if len(self.ops) - self.start > 1 and post_result[0] is not None:
             return post_result[0]
         else:
             return execute_ret
 
 
 class Par(Op):
+    """
+    Execute a list of operations concurrently
+
+    .. code-block:: python
+        :linenos:
+
+        Par(
+            *[ContainerStart(c) for c in containers],
+            window=8,
+        )
+
+    With ``window`` at most that many of the operations are in flight; the next one is started as soon as one
+    of them completes.
+    """
+    __slots__ = ('ops', 'window')
+
     ops: List[Op]
+    window: Optional[int]
 
-    def __init__(self, *ops: WT):
+    def __init__(self, *ops: WT, window: Optional[int] = None):
         if len(ops):
             if _check_callable(ops[0]):
                 fn, = ops
@@ -1022,6 +1575,7 @@ class Par(Op):
             wr_ops.append(_wr(op))
 
         self.ops = wr_ops
+        self.window = _window(window)
 
         self.__post_init__()
 
@@ -1030,13 +1584,27 @@ class Par(Op):
         return f'{self.__class__.__name__}({r})'
 
     def dependencies(self) -> List['Op']:
-        return self.ops
+        return [] if _laned(self.ops, self.window) else self.ops
 
     def execute(self, *args: Any) -> TRes:
         return list(args)
 
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        if _laned(self.ops, self.window):
+            return Lane.start(self._loc, Window(Stream(self.ops)), self.window, None, None)
+        else:
+            return []
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        if _laned(self.ops, self.window):
+            return post_result[0].collect()
+        else:
+            return execute_ret
+
 
 class Arr(Op):
+    __slots__ = ('items',)
+
     items: List[Op]
 
     def __init__(self, *args: Op):
@@ -1051,6 +1619,231 @@ class Arr(Op):
         return args
 
 
+class Reduce(Op):
+    """
+    Combine the items of a sequence with an associative function, optionally starting from ``initial``
+
+    .. code-block:: python
+        :linenos:
+
+        Reduce(
+            lambda a, b: a + b,
+            Con([1, 2, 3, 4]),
+        )
+
+    The items are combined in a balanced tree, ``((1 + 2) + (3 + 4))``, so the tree is ``log2(n)`` deep and the
+    independent combinations at every level may run at the same time. The order of the items is kept.
+    """
+
+    tail = True
+
+    __slots__ = ('left', 'right', 'body', 'iter', 'initial')
+
+    left: Var
+    right: Var
+    body: Op
+    iter: Op
+    initial: Union[NoVal, Op]
+
+    def __init__(self, *args: WT, initial: Union[NoVal, WT] = NO_VALUE):
+        if _check_callable(args[0]):
+            left, right, body, it = self.from_ext(*args)
+        else:
+            left, right, body, it = args
+
+        self.left = _wr(left)
+        self.right = _wr(right)
+        self.body = _wr(body)
+        self.iter = _wr(it)
+        self.initial = initial if initial is NO_VALUE else _wr(initial)
+
+        assert isinstance(self.left, Var), self.left
+        assert isinstance(self.right, Var), self.right
+        assert isinstance(self.body, Op), self.body
+        assert isinstance(self.iter, Op), self.iter
+
+        self.__post_init__()
+
+    @classmethod
+    def from_ext(cls, fn: Callable, it: WT):
+        left, right = _assert_callable(fn)
+
+        left, right = Var(left), Var(right)
+
+        return left, right, fn(left, right), it
+
+    def dependencies(self) -> List['Op']:
+        initial = [] if self.initial is NO_VALUE else [self.initial]
+        return [self.iter] + initial
+
+    def execute(self, items: Any, *initial: Any) -> TRes:
+        if not isinstance(items, list):
+            raise OpError(self, f'Returned iterable `{items}` is not a list')
+
+        items = list(initial) + items
+
+        if len(items) == 0:
+            raise OpError(self, 'Reduce of an empty sequence with no initial value')
+
+        return items
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        level = [Con._make(self._loc, value=x) for x in result]
+
+        while len(level) > 1:
+            pairs = [
+                With._make(self._loc, vars=[self.left, self.right], vals=[a, b], map_op=self.body)
+                for a, b in zip(level[::2], level[1::2])
+            ]
+
+            if len(level) % 2:
+                pairs.append(level[-1])
+
+            level = pairs
+
+        return level
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        return post_result[0]
+
+
+DEFAULT_WINDOW = 64
+"""Items of a :class:`Stream` consumed concurrently by :class:`Map` and :class:`Fil` unless ``window`` is given;
+lists are not windowed by default"""
+
+
+class Stream:
+    """
+    Items produced lazily by a Python iterator, see :class:`Source`. A stream can only be consumed once.
+    """
+
+    def __init__(self, it: Iterable[Any]):
+        self.it = iter(it)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.it!r})'
+
+
+class Window:
+    """Items of a :class:`Stream` pulled by the lanes consuming it, and their results"""
+
+    def __init__(self, stream: Stream):
+        self.stream = stream
+        self.pulled = 0
+        self.results = {}
+
+    def pull(self) -> Optional[Tuple[int, Any]]:
+        try:
+            item = next(self.stream.it)
+        except StopIteration:
+            return None
+
+        idx = self.pulled
+        self.pulled += 1
+        return idx, item
+
+    def put(self, idx: int, value: Any):
+        self.results[idx] = value
+
+    def collect(self) -> List[Any]:
+        return [self.results.pop(idx) for idx in range(self.pulled)]
+
+
+class Lane(Op):
+    """
+    Execute ``map`` for an item of a :class:`Window` (or the item itself if ``target`` is None), then continue
+    with the next item pulled from the window.
+
+    ``window`` lanes consume a stream at once, which bounds the number of items in flight.
+    """
+
+    tail = True
+
+    __slots__ = ('window', 'idx', 'item', 'target', 'map')
+
+    window: Window
+    idx: int
+    item: Any
+    target: Optional[Var]
+    map: Optional[Op]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.idx}, {repr(self.target)}|{repr(self.map)})'
+
+    @classmethod
+    def start(cls, loc: Optional[Loc], window: Window, size: int, target: Optional[Var], map: Optional[Op]) -> \
+            List['Lane']:
+        lanes = []
+
+        for _ in range(size):
+            pulled = window.pull()
+
+            if pulled is None:
+                break
+
+            idx, item = pulled
+
+            lanes.append(cls._make(loc, window=window, idx=idx, item=item, target=target, map=map))
+
+        return lanes
+
+    def dependencies(self) -> List['Op']:
+        if self.target is None:
+            return [self.item]
+
+        return [With._make(self._loc, vars=[self.target], vals=[Con._make(self._loc, value=self.item)], map_op=self.map)]
+
+    def execute(self, ret: Any) -> TRes:
+        self.window.put(self.idx, ret)
+        return self.window
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        pulled = self.window.pull()
+
+        if pulled is None:
+            return []
+
+        idx, item = pulled
+
+        return [self._replace(idx=idx, item=item)]
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        return post_result[0] if len(post_result) else execute_ret
+
+
+def _window(window: Optional[int]) -> Optional[int]:
+    if window is not None and window < 1:
+        raise ValueError(f'window must be at least 1, got {window}')
+
+    return window
+
+
+def _laned(items: Any, window: Optional[int]) -> bool:
+    """:return: True if ``items`` are consumed by lanes rather than all at once"""
+    return isinstance(items, Stream) or (window is not None and isinstance(items, list) and len(items) > window)
+
+
+class Source(Eval):
+    """
+    Turn the iterable returned by a function into a :class:`Stream` consumed by :class:`Map` and :class:`Fil`
+    without materialising it.
+
+    .. code-block:: python
+        :linenos:
+
+        Map(
+            lambda line: Log(line),
+            Source(Var('path'), lambda path: open(path)),
+            window=16,
+        )
+    """
+
+    __slots__ = ()
+
+    def execute(self, *args: Any) -> TRes:
+        return Stream(super().execute(*args))
+
+
 class Map(Op):
     """
     Map a sequence to a sequence of new values
@@ -1062,13 +1855,20 @@ class Map(Op):
             lambda x: x * x,
             Con([1, 2, 3),
         )
+
+    The sequence is either a ``list`` or a :class:`Stream`. At most ``window`` items are mapped at once, the
+    next item is taken as soon as one of them completes; streams default to :data:`DEFAULT_WINDOW`, lists are
+    mapped all at once unless ``window`` is given.
     """
 
+    __slots__ = ('target', 'map', 'iter', 'window')
+
     target: Var
     map: Op
     iter: Op
+    window: Optional[int]
 
-    def __init__(self, *args: WT):
+    def __init__(self, *args: WT, window: Optional[int] = None):
         if _check_callable(args[0]):
             tar, map, it = self.from_ext(*args)
         else:
@@ -1077,11 +1877,14 @@ class Map(Op):
         self.target = _wr(tar)
         self.map = _wr(map)
         self.iter = _wr(it)
+        self.window = _window(window)
 
         assert isinstance(self.target, Op)
         assert isinstance(self.map, Op)
         assert isinstance(self.iter, Op)
 
+        self.__post_init__()
+
     @classmethod
     def from_ext(cls, map_fn: Callable, it: WT):
         map_arg, = _assert_callable(map_fn)
@@ -1099,19 +1902,24 @@ class Map(Op):
         return arg
 
     def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        if isinstance(result, Stream):
+            return Lane.start(self._loc, Window(result), self.window or DEFAULT_WINDOW, self.target, self.map)
+
         if not isinstance(result, list):
             raise OpError(self, f'Returned iterable `{result}` is not a list')
 
+        if _laned(result, self.window):
+            return Lane.start(self._loc, Window(Stream(result)), self.window, self.target, self.map)
+
         return [
-            With(
-                self.target,
-                Con(x),
-                self.map
-            )
+            With._make(self._loc, vars=[self.target], vals=[Con._make(self._loc, value=x)], map_op=self.map)
             for x in result
         ]
 
     def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        if _laned(execute_ret, self.window):
+            return post_result[0].collect() if len(post_result) else []
+
         return [
             x for x in post_result
         ]
@@ -1128,13 +1936,19 @@ class Fil(Op):
             lambda x: x > 2,
             Con([1, 2, 3),
         )
+
+    Streams are consumed as in :class:`Map`.
     """
 
+    __slots__ = ('target', 'filter', 'iter', 'window', 'pair')
+
     target: Var
     filter: Op
     iter: Op
+    window: Optional[int]
+    pair: Optional[Arr]
 
-    def __init__(self, *args: WT):
+    def __init__(self, *args: WT, window: Optional[int] = None):
         if _check_callable(args[0]):
             tar, fil, it = self.from_ext(*args)
         else:
@@ -1143,11 +1957,15 @@ class Fil(Op):
         self.target = _wr(tar)
         self.filter = _wr(fil)
         self.iter = _wr(it)
+        self.window = _window(window)
+        self.pair = None
 
         assert isinstance(self.target, Op)
         assert isinstance(self.filter, Op)
         assert isinstance(self.iter, Op)
 
+        self.__post_init__()
+
     @classmethod
     def from_ext(cls, fil: Callable, it: WT):
         fil_arg, = _assert_callable(fil)
@@ -1165,25 +1983,141 @@ class Fil(Op):
         return arg
 
     def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        if self.pair is None:
+            self.pair = self._pair()
+
+        if isinstance(result, Stream):
+            return Lane.start(self._loc, Window(result), self.window or DEFAULT_WINDOW, self.target, self.pair)
+
         if not isinstance(result, list):
             raise OpError(self, f'Returned iterable `{result}` is not a list')
 
+        if _laned(result, self.window):
+            return Lane.start(self._loc, Window(Stream(result)), self.window, self.target, self.pair)
+
         return [
-            With(
-                self.target,
-                Con(x),
-                Arr(self.target, self.filter)
-            )
+            With._make(self._loc, vars=[self.target], vals=[Con._make(self._loc, value=x)], map_op=self.pair)
             for x in result
         ]
 
+    def _pair(self) -> Arr:
+        return Arr._make(self._loc, items=(self.target, self.filter))
+
     def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        if _laned(execute_ret, self.window):
+            post_result = post_result[0].collect() if len(post_result) else []
+
         return [
             x for x, f in post_result if f
         ]
 
 
+_DROPPED = object()
+
+
+class PipeItem(Op):
+    """Execute the stages of a :class:`Pipe` from ``stage`` on for a single item"""
+
+    tail = True
+
+    __slots__ = ('stages', 'stage', 'value')
+
+    stages: List[Union[Map, Fil]]
+    stage: int
+    value: Any
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.stage}, {repr(self.value)})'
+
+    def dependencies(self) -> List['Op']:
+        stage = self.stages[self.stage]
+        body = stage.filter if isinstance(stage, Fil) else stage.map
+
+        return [With._make(stage._loc, vars=[stage.target], vals=[Con._make(stage._loc, value=self.value)], map_op=body)]
+
+    def execute(self, ret: Any) -> TRes:
+        if isinstance(self.stages[self.stage], Fil):
+            return self.value if ret else _DROPPED
+        else:
+            return ret
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        if result is _DROPPED or self.stage + 1 == len(self.stages):
+            return []
+
+        return [self._replace(stage=self.stage + 1, value=result)]
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        return post_result[0] if len(post_result) else execute_ret
+
+
+class Pipe(Op):
+    """
+    Adjacent :class:`Map` and :class:`Fil` nodes fused by the experimental :func:`xmake.compiler.fuse`: every item
+    goes through all of the ``stages`` on its own, so no intermediate list is built. It still runs a job per item and
+    stage, so it is not faster than the separate nodes.
+
+    .. code-block:: python
+        :linenos:
+
+        Map(lambda x: x + 1, Fil(lambda x: x > 2, Map(lambda x: x * 2, xs)))
+        # x * 2 of the last item may run after x + 1 of the first one
+        compile_op(Map(lambda x: x + 1, Fil(lambda x: x > 2, Map(lambda x: x * 2, xs))), DEFAULT_PASSES + [fuse])
+
+    The stages are the fused nodes with ``iter`` set to None. Streams and ``window`` are handled as in :class:`Map`.
+    """
+
+    __slots__ = ('stages', 'iter', 'window')
+
+    stages: List[Union[Map, Fil]]
+    iter: Op
+    window: Optional[int]
+
+    def __init__(self, stages: List[Union[Map, Fil]], it: WT, window: Optional[int] = None):
+        self.stages = stages
+        self.iter = _wr(it)
+        self.window = _window(window)
+
+        for stage in self.stages:
+            assert isinstance(stage, (Map, Fil)), stage
+
+        self.__post_init__()
+
+    def dependencies(self) -> List['Op']:
+        return [self.iter]
+
+    def execute(self, arg) -> TRes:
+        return arg
+
+    def _item(self, value: Any) -> PipeItem:
+        return PipeItem._make(self._loc, stages=self.stages, stage=0, value=value)
+
+    def post_dependencies(self, result: TRes, *pre_result: List[TRes]) -> List['Op']:
+        if isinstance(result, Stream):
+            window = Window(Stream(self._item(x) for x in result.it))
+            return Lane.start(self._loc, window, self.window or DEFAULT_WINDOW, None, None)
+
+        if not isinstance(result, list):
+            raise OpError(self, f'Returned iterable `{result}` is not a list')
+
+        if _laned(result, self.window):
+            window = Window(Stream(self._item(x) for x in result))
+            return Lane.start(self._loc, window, self.window, None, None)
+
+        return [self._item(x) for x in result]
+
+    def post_execute(self, execute_ret: TRes, pre_result: List[TRes], post_result: List[TPostRes]) -> TPostRes:
+        if _laned(execute_ret, self.window):
+            post_result = post_result[0].collect() if len(post_result) else []
+
+        return [
+            x for x in post_result if x is not _DROPPED
+        ]
+
+
 class CPS(Op):
+    __slots__ = ('arg', 'ret', 'ops')
+
     arg: Var
     ret: Var
     ops: List[Op]
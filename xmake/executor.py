@@ -1,20 +1,31 @@
 import logging
-from typing import Any, Dict, List
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Callable, Tuple
 
 from dataclasses import dataclass, field
 
+from xmake.compiler import compile_op
 from xmake.dep import KeyedDeps
-from xmake.dsl import Op, Ctx
+from xmake.dsl import Op, Ctx, CTX_COMPACT_MIN
 from xmake.error import ExecError
+from xmake.metrics import ExecStats, Metrics, MetricsDumper
 from xmake.runtime import Step, JOB_STATE_SUCCESSOR, JOB_STATE_PREDECESSOR, JobRecID, JobRec
+from xmake.trace import Tracer, LogTracer
 
 
-class LazyLog:
-    def __init__(self, callable):
-        self.callable = callable
+_TEARDOWNS: 'ContextVar[Optional[List[Callable[[], Any]]]]' = ContextVar('_TEARDOWNS', default=None)
 
-    def __str__(self) -> str:
-        return self.callable()
+
+def at_teardown(fn: Callable[[], Any]):
+    """
+    Add ``fn`` to the teardowns of the execution running the calling op, see :attr:`Executor.teardowns`; e.g. to
+    release the resources the op acquires if the graph fails before releasing them.
+    """
+    teardowns = _TEARDOWNS.get()
+
+    if teardowns is not None and fn not in teardowns:
+        teardowns.append(fn)
 
 
 @dataclass
@@ -30,10 +41,24 @@ class Counter:
 @dataclass()
 class Executor:
     should_trace: bool = False
+    compile: bool = False
+    tail_calls: bool = True
+    inline: bool = True
+    tracers: List[Tracer] = field(default_factory=list)
+    teardowns: List[Callable[[], Any]] = field(default_factory=list)
+    """
+    Called in the reverse order when the execution fails, e.g. to remove the resources the graph did not release; the
+    ones added by the ops with :func:`at_teardown` are called first
+    """
+    metrics_path: Optional[str] = None
+    metrics_interval: float = 1.
     deps: KeyedDeps[JobRecID, JobRec] = field(default_factory=lambda: KeyedDeps(lambda x: x.id))
     ctr: Counter = field(default_factory=Counter)
     rets: Dict[JobRecID, Any] = field(default_factory=dict)
     reqs: Dict[JobRecID, List[JobRecID]] = field(default_factory=dict)
+    stats: ExecStats = field(default_factory=ExecStats)
+    dispatch: Dict[Step, Callable[[JobRec, List[JobRec]], Tuple[Ctx, List[Op], Any]]] = \
+        field(init=False, repr=False, default_factory=dict)
 
     # def get_depth(self, jid: JobRecID) -> int:
     #     r = 0
@@ -47,76 +72,267 @@ class Executor:
     #             return r
     #
 
+    def __post_init__(self):
+        self.dispatch = {
+            Step.Deps: self.execute_deps,
+            Step.Exec: self.execute_exec,
+            Step.PostDeps: self.execute_postdeps,
+            Step.PostExec: self.execute_postexec,
+            Step.Result: self.execute_result,
+        }
+
+        if self.should_trace:
+            self.tracers.append(LogTracer())
+
+        if self.metrics_path:
+            self.tracers.append(MetricsDumper(self, self.metrics_path, self.metrics_interval))
+
+    def metrics(self) -> Metrics:
+        elapsed = 0. if self.stats.started is None else perf_counter() - self.stats.started
+
+        return Metrics(
+            pending=len(self.deps.deps.pending),
+            blocked=len(self.deps.deps.deps),
+            values=len(self.deps),
+            rets=len(self.rets),
+            reqs=len(self.reqs),
+            steps=self.stats.steps,
+            jobs=self.stats.jobs,
+            tail_calls=self.stats.tail_calls,
+            inlined=self.stats.inlined,
+            jobs_per_sec=self.stats.jobs / elapsed if elapsed > 0 else 0.,
+            peak_ctx_depth=self.stats.peak_ctx_depth,
+            elapsed=elapsed,
+        )
+
     def execute(self, root: Op):
+        teardowns = list(self.teardowns)
+        token = _TEARDOWNS.set(teardowns)
+
+        try:
+            return self._execute(root)
+        except BaseException:
+            self.teardown(teardowns)
+            raise
+        finally:
+            _TEARDOWNS.reset(token)
+
+    def teardown(self, teardowns: Optional[List[Callable[[], Any]]] = None):
+        for fn in reversed(self.teardowns if teardowns is None else teardowns):
+            try:
+                fn()
+            except Exception:
+                logging.getLogger(__name__).exception('%s', fn)
+
+    def _execute(self, root: Op):
+        if self.compile:
+            root = compile_op(root)
+
         root_ctx = Ctx()
         # we would like the queue to execute the jobs.
         exit_rec = JobRec(self.ctr(), Step.Deps, None, root_ctx)
         root_rec = JobRec(self.ctr(), Step.Deps, root, root_ctx)
 
-        self.reqs[root_rec.id] = [root_rec.with_step(Step.Result).id]
-
         self.deps.put(exit_rec, root_rec.with_step(Step.Result))
         self.deps.put(root_rec)
 
+        tracers = self.tracers
+        stats = self.stats
+        dispatch = self.dispatch
+        inline = self.inline
+
+        if stats.started is None:
+            stats.started = perf_counter()
+
+        for tracer in tracers:
+            tracer.scheduled(root_rec)
+
         while len(self.deps):
-            job_rec, job_deps = self.deps.pop()
+            if self.deps.peek() is None:
+                self.wait()
+                continue
 
-            if self.should_trace:
-                # logging.getLogger(__name__).warning('[0] %s', self.get_depth(job_rec.id))
-                logging.getLogger(__name__).warning('[+] %s %s -> { %s }', job_rec.id, job_rec.job, ', '.join([repr(x.job) for x in job_deps]))
-                for k, v in dict(job_rec.ctx.mappings).items():
-                    logging.getLogger(__name__).warning('[=] %s=%s', k, repr(v)[:60])
+            job_rec, job_deps = self.deps.pop()
 
             if job_rec.job is None:
                 exit_job_dep, = job_deps
-                return self.rets[exit_job_dep.id]
 
-            callable_fun = getattr(self, 'execute_' + job_rec.step.value.lower())
+                if self.metrics_path:
+                    self.metrics().write_prometheus(self.metrics_path)
+
+                return self.rets.pop(exit_job_dep.id)
+
+            if job_rec.step is Step.Deps and job_rec.job.remote and self.offload(job_rec):
+                continue
+
+            callable_fun = dispatch[job_rec.step]
+
+            if tracers:
+                for tracer in tracers:
+                    tracer.started(job_rec, job_deps)
+
+                started = perf_counter()
 
             try:
                 new_ctx, deps, ret = callable_fun(job_rec, job_deps)
             except Exception as e:
+                if tracers:
+                    elapsed = perf_counter() - started
+
+                    for tracer in tracers:
+                        tracer.failed(job_rec, e, elapsed)
+
                 raise ExecError(job_rec, job_deps, e)
 
+            if tracers:
+                elapsed = perf_counter() - started
+
+                for tracer in tracers:
+                    tracer.finished(job_rec, ret, elapsed)
+
+            stats.steps += 1
+
+            if job_rec.step is Step.Result:
+                stats.jobs += 1
+
+            ctx_depth = len(new_ctx.mappings)
+
+            if ctx_depth > stats.peak_ctx_depth:
+                stats.peak_ctx_depth = ctx_depth
+
+            if deps and job_rec.step is Step.PostDeps and len(deps) == 1 and self.tail_calls and job_rec.job.tail \
+                    and not (inline and deps[0].leaf):
+                self._tail_call(job_rec, deps[0], new_ctx)
+
+                stats.jobs += 1
+                stats.tail_calls += 1
+                continue
+
             deps_objs = []
 
-            self.reqs[job_rec.id] = []
+            if job_rec.step is Step.Deps or job_rec.step is Step.PostDeps:
+                self.reqs[job_rec.id] = []
 
             for dep in deps:
+                if inline and dep.leaf:
+                    self.reqs[job_rec.id].append(self._inline(dep, new_ctx))
+                    continue
+
                 dep_rec = JobRec(self.ctr(), Step.Deps, dep, new_ctx)
 
                 self.deps.put(dep_rec)
 
+                for tracer in tracers:
+                    tracer.scheduled(dep_rec)
+
                 dep_res_rec = dep_rec.with_step(Step.Result)
                 deps_objs.append(dep_res_rec)
 
                 self.reqs[job_rec.id].append(dep_res_rec.id)
 
-            self.rets[job_rec.id] = ret
+            if job_rec.step is Step.Exec or job_rec.step is Step.PostExec or job_rec.step is Step.Result:
+                self.rets[job_rec.id] = ret
 
             succ = JOB_STATE_SUCCESSOR.get(job_rec.step)
 
-            if self.should_trace:
-                logging.getLogger(__name__).warning('[-] %s %s', job_rec.id, succ)
-                logging.getLogger(__name__).warning('[_] %s', ret)
-
-                for k, v in dict(new_ctx.mappings).items():
-                    logging.getLogger(__name__).warning('[z] %s=%s', k, v)
-
             if succ:
                 self.deps.put(job_rec.with_step(succ).with_ctx(new_ctx), *deps_objs)
             else:
                 assert len(deps_objs) == 0, deps_objs
 
-            pred = JOB_STATE_PREDECESSOR.get(job_rec.step)
+            if job_rec.step is Step.PostExec:
+                self._release(job_rec, Step.Deps, Step.PostDeps)
+            elif job_rec.step is Step.Result:
+                del self.rets[job_rec.with_step(Step.PostExec).id]
 
-            if pred:
-                pred_job_rec = job_rec.with_step(pred)
+    def offload(self, job_rec: JobRec) -> bool:
+        """
+        Called for the jobs marked with :attr:`xmake.dsl.Op.remote` when they are ready to be executed.
 
-                # todo cleanup
-                continue
+        :return: True if the job is executed elsewhere; its result is then passed to :meth:`complete`
+        """
+        return False
+
+    def wait(self):
+        """Block until a job executed elsewhere completes; called when no job is ready to be executed"""
+        raise RuntimeError('No jobs are ready to be executed')
+
+    def complete(self, job_rec: JobRec, ret: Any):
+        """Resume the graph with the result of a job executed elsewhere, as if it had finished ``Step.PostExec``"""
+        self.rets[job_rec.with_step(Step.PostExec).id] = ret
+        self.deps.put(job_rec.with_step(Step.Result))
+
+    def _release(self, job_rec: JobRec, *steps: Step):
+        """Forget the values only needed by the job itself once it had used them"""
+        del self.rets[job_rec.with_step(Step.Exec).id]
+
+        for step in steps:
+            for dep_id in self.reqs.pop(job_rec.with_step(step).id):
+                del self.rets[dep_id]
+
+    def _inline(self, job: Op, ctx: Ctx) -> JobRecID:
+        """Evaluate a leaf node (see :attr:`xmake.dsl.Op.leaf`) as a single ``Step.Result``"""
+        job_rec = JobRec(self.ctr(), Step.Result, job, ctx)
+        tracers = self.tracers
+
+        if tracers:
+            for tracer in tracers:
+                tracer.scheduled(job_rec.with_step(Step.Deps))
+
+            for tracer in tracers:
+                tracer.started(job_rec, [])
+
+            started = perf_counter()
+
+        try:
+            _, ret = job.context_execute(ctx)
+        except Exception as e:
+            if tracers:
+                elapsed = perf_counter() - started
+
+                for tracer in tracers:
+                    tracer.failed(job_rec, e, elapsed)
+
+            raise ExecError(job_rec, [], e)
+
+        if tracers:
+            elapsed = perf_counter() - started
+
+            for tracer in tracers:
+                tracer.finished(job_rec, ret, elapsed)
+
+        self.stats.steps += 1
+        self.stats.jobs += 1
+        self.stats.inlined += 1
+
+        ret_id = job_rec.id
+        self.rets[ret_id] = ret
+
+        return ret_id
+
+    def _tail_call(self, job_rec: JobRec, dep: Op, ctx: Ctx):
+        """Replace the job with its only post-dependency, see :attr:`xmake.dsl.Op.tail`"""
+        if len(ctx.mappings) > CTX_COMPACT_MIN:
+            ctx = ctx.compacted()
+
+        dep_rec = JobRec(self.ctr(), Step.Deps, dep, ctx)
+
+        self.deps.put(dep_rec)
+
+        for tracer in self.tracers:
+            tracer.scheduled(dep_rec)
+
+        res_id = job_rec.with_step(Step.Result).id
+        dep_res_rec = dep_rec.with_step(Step.Result)
+
+        for waiter_id in self.deps.redirect(res_id, dep_res_rec):
+            pred = JOB_STATE_PREDECESSOR.get(waiter_id.step)
+
+            if pred:
+                reqs = self.reqs[waiter_id.with_step(pred)]
+                reqs[reqs.index(res_id)] = dep_res_rec.id
 
-                del self.rets[pred_job_rec]
+        self._release(job_rec, Step.Deps)
 
     def execute_deps(self, job_rec: JobRec, job_deps: List[JobRec]):
         ctx, deps = job_rec.job.context_dependencies(job_rec.ctx)
@@ -0,0 +1,83 @@
+import os
+from time import perf_counter
+from typing import Any, Optional
+
+from dataclasses import dataclass, field, fields
+
+from xmake.runtime import JobRec
+from xmake.trace import Tracer
+
+
+@dataclass
+class ExecStats:
+    """Counters updated by the executor on every step"""
+
+    steps: int = 0
+    jobs: int = 0
+    tail_calls: int = 0
+    inlined: int = 0
+    peak_ctx_depth: int = 0
+    started: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Metrics:
+    """A point-in-time snapshot of the executor state, see :meth:`xmake.executor.Executor.metrics`"""
+
+    pending: int
+    """Jobs that are ready to be executed"""
+    blocked: int
+    """Jobs that are waiting for their dependencies"""
+    values: int
+    """Job records held by the dependency graph"""
+    rets: int
+    reqs: int
+    steps: int
+    jobs: int
+    """Jobs that had reached ``Step.Result`` or were replaced by a tail call"""
+    tail_calls: int
+    """Jobs that were replaced by their only post-dependency, skipping ``Step.PostExec`` and ``Step.Result``"""
+    inlined: int
+    """Leaf jobs evaluated by their parent in a single ``Step.Result``, see :attr:`xmake.dsl.Op.leaf`"""
+    jobs_per_sec: float
+    peak_ctx_depth: int
+    elapsed: float
+
+    def to_prometheus(self, prefix='xmake_executor_') -> str:
+        lines = []
+
+        for f in fields(self):
+            kind = 'counter' if f.name in ('steps', 'jobs', 'tail_calls', 'inlined') else 'gauge'
+            lines.append(f'# TYPE {prefix}{f.name} {kind}')
+            lines.append(f'{prefix}{f.name} {getattr(self, f.name)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, prefix='xmake_executor_'):
+        """Atomically replace ``path`` with the text exposition of the metrics"""
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'w+') as f_obj:
+            f_obj.write(self.to_prometheus(prefix))
+
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class MetricsDumper(Tracer):
+    """Dump the metrics of ``executor`` into ``path`` at most every ``interval`` seconds"""
+
+    executor: Any
+    path: str
+    interval: float = 1.
+    last: float = field(default=float('-inf'), repr=False)
+
+    def finished(self, rec: JobRec, ret: Any, elapsed: float):
+        now = perf_counter()
+
+        if now - self.last >= self.interval:
+            self.last = now
+            self.executor.metrics().write_prometheus(self.path)
+
+    def failed(self, rec: JobRec, e: Exception, elapsed: float):
+        self.executor.metrics().write_prometheus(self.path)
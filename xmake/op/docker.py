@@ -1,12 +1,21 @@
+import gzip
 import io
 import logging
 import os
+import shutil
 import tarfile
+import threading
+import zlib
 from _signal import SIGTERM
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from fnmatch import fnmatch
 from os.path import expanduser
-from typing import Any, List, Dict, Tuple, Optional, Union
+from time import time
+from typing import Any, List, Dict, Tuple, Optional, Union, Deque
 from urllib.parse import ParseResult, urlparse
+from uuid import uuid4
 
 from dataclasses import field, dataclass
 from docker import DockerClient
@@ -15,6 +24,7 @@ from docker.types import ContainerConfig as _CC, HostConfig as _HC
 from docker.utils import split_command
 
 from xmake.dsl import Var, Op, TRes
+from xmake.executor import at_teardown
 
 
 class Obj(dict):
@@ -73,6 +83,7 @@ class Container(Obj):
 @dataclass
 class DockerClientWrapper:
     cli: DockerClient
+    url: Optional[str] = None
 
     def __getattr__(self, item):
         return getattr(self.cli, item)
@@ -81,6 +92,307 @@ class DockerClientWrapper:
         self.cli.close()
 
 
+@dataclass
+class DockerHosts:
+    """
+    Bind ``docker`` to several daemons at once.
+
+    A :class:`ContainerCreate` is placed on the daemon with the least containers created through the binding (and not
+    yet removed), or on the daemon picked by the hash of its ``label`` if it has one. The containers, execs and networks
+    returned remember their daemon in ``_host``, and the ops passed them are executed on it. The image ops and the
+    listings are executed on every daemon.
+
+    .. code-block:: python
+        :linenos:
+
+        With(
+            DockerHosts(['tcp://10.0.0.1:2375', 'tcp://10.0.0.2:2375'], label='job'),
+            lambda docker: With(
+                ImagePull('alpine:3.5'),
+                lambda i: ContainerCreate(i, 'a', ['true'], ContainerConfig(labels={'job': 'a'}))
+            )
+        )
+    """
+    urls: List[str]
+    label: Optional[str] = None
+    load: Dict[str, int] = field(default_factory=dict)
+    clients: Dict[str, DockerClientWrapper] = field(default_factory=dict, repr=False)
+
+    def __getstate__(self):
+        return {**self.__dict__, 'clients': {}}
+
+    def client(self, url: str) -> DockerClientWrapper:
+        if url not in self.clients:
+            self.clients[url] = DockerClientWrapper(DockerClient(url), url)
+
+        return self.clients[url]
+
+    def place(self, op: 'DockerOp') -> str:
+        """:return: the daemon to execute ``op`` on"""
+        value = None if self.label is None else op.placement_labels().get(self.label)
+
+        if value is not None:
+            return self.urls[zlib.crc32(str(value).encode()) % len(self.urls)]
+
+        return min(self.urls, key=lambda x: self.load.get(x, 0))
+
+    def execute(self, op: 'DockerOp') -> Any:
+        host = op.host()
+
+        if host is None and op.broadcast:
+            rets = [tagged(op.execute(self.client(x)), x) for x in self.urls]
+
+            if all(isinstance(x, list) for x in rets):
+                return [y for x in rets for y in x]
+
+            return rets[0]
+
+        host = self.assign(op)
+
+        return tagged(op.execute(self.client(host)), host)
+
+    def assign(self, op: 'DockerOp') -> str:
+        """:return: the daemon ``op`` is executed on, counting the containers it creates or removes there"""
+        host = op.host()
+
+        if host is None:
+            host = self.place(op)
+
+        self.load[host] = self.load.get(host, 0) + op.load
+
+        return host
+
+
+def tagged(ret: Any, host: str) -> Any:
+    """:return: ``ret`` with its containers, execs and networks remembering their daemon ``host``"""
+    if isinstance(ret, list):
+        return [tagged(x, host) for x in ret]
+
+    if isinstance(ret, (Container, Exec, Network)):
+        ret.setdefault('_host', host)
+
+    return ret
+
+
+class DockerEvents:
+    """
+    A single subscription to the events of a daemon, shared by the waits on all of its containers and by the index of
+    its images (reloaded after any of them had changed)
+    """
+
+    _lock = threading.Lock()
+    _shared: Dict[str, 'DockerEvents'] = {}
+
+    def __init__(self, cli: DockerClient, url: Optional[str] = None, owned: bool = True):
+        self.cli = cli
+        self.url = url
+        self.owned = owned
+        self.lock = threading.Lock()
+        self.waits: Dict[str, List[Future]] = {}
+        self.images: Optional[Dict[str, Dict[str, Any]]] = None
+        self.version = 0
+        self.closed = False
+        self.closing = False
+
+        filters = {
+            'type': ['container', 'image'],
+            'event': ['die', 'pull', 'tag', 'untag', 'delete', 'import', 'load'],
+        }
+
+        # the subscription is active once the request returns, so no event is missed by the waits registered later
+        self.stream = cli.api.events(filters=filters, decode=True)
+        self.thread = threading.Thread(target=self._read, name=f'{self.__class__.__name__}({url})', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def of(cls, c: DockerClient) -> Optional['DockerEvents']:
+        """
+        :return: the subscription shared by the clients of the daemon of ``c``, if its URL is known. A client created
+            without a URL (e.g. by ``docker.from_env()``) is the one subscribed, and must stay open while it is used
+        """
+        url = getattr(c, 'url', None)
+        owned = url is not None
+
+        if url is None:
+            url = _url(c)
+
+        if url is None:
+            return None
+
+        with cls._lock:
+            if url not in cls._shared:
+                cls._shared[url] = cls(DockerClient(url) if owned else c, url, owned)
+
+            return cls._shared[url]
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            xs = list(cls._shared.values())
+
+        for x in xs:
+            x.close()
+
+    def close(self):
+        """Stop receiving the events, failing the waits still pending"""
+        self.closing = True
+        self.stream.close()
+        self.thread.join()
+
+        if self.owned:
+            self.cli.close()
+
+    def wait(self, c: DockerClient, ident: str) -> Future:
+        """:return: a future resolved with the exit status of the container ``ident`` once it is not running"""
+        fut = Future()
+
+        with self.lock:
+            if self.closed:
+                raise ConnectionError(f'The events of `{self.url}` are not received anymore')
+
+            self.waits.setdefault(ident, []).append(fut)
+
+        # the container might have stopped before the wait was registered
+        try:
+            state = c.api.inspect_container(ident)['State']
+        except BaseException:
+            self.discard(ident, fut)
+            raise
+
+        if not state['Running']:
+            self._resolve(ident, state['ExitCode'])
+
+        return fut
+
+    def image(self, c: DockerClient, name: str) -> Optional[Dict[str, Any]]:
+        """:return: the local image named ``name`` (a tag or an ID), if any"""
+        with self.lock:
+            images, version, closed = self.images, self.version, self.closed
+
+        if images is None or closed:
+            images = _index(c.api.images())
+
+            with self.lock:
+                # an image changed while they were listed
+                if self.version == version:
+                    self.images = images
+
+        return images.get(name if name.startswith('sha256:') else Image.tag(name))
+
+    def discard(self, ident: str, fut: Future):
+        """Forget the wait ``fut`` on the container ``ident`` that timed out or was cancelled"""
+        fut.cancel()
+
+        with self.lock:
+            futs = self.waits.get(ident, [])
+
+            if fut in futs:
+                futs.remove(fut)
+
+            if not futs:
+                self.waits.pop(ident, None)
+
+    def invalidate(self):
+        with self.lock:
+            self.images = None
+            self.version += 1
+
+    def _resolve(self, ident: str, exit_code: int):
+        with self.lock:
+            futs = self.waits.pop(ident, [])
+
+        for fut in futs:
+            if not fut.done():
+                fut.set_result({'StatusCode': exit_code, 'Error': None})
+
+    def _read(self):
+        try:
+            for x in self.stream:
+                actor = x.get('Actor', {})
+
+                if x.get('Type') == 'image':
+                    self.invalidate()
+                else:
+                    self._resolve(x.get('id') or actor['ID'], int(actor.get('Attributes', {}).get('exitCode', 0)))
+        except Exception:
+            if not self.closing:
+                logging.getLogger(__name__).exception('%s', self.url)
+        finally:
+            with self.lock:
+                self.closed = True
+                futs = [y for x in self.waits.values() for y in x]
+                self.waits = {}
+
+            with self._lock:
+                if self._shared.get(self.url) is self:
+                    del self._shared[self.url]
+
+            for fut in futs:
+                if not fut.done():
+                    fut.set_exception(ConnectionError(f'The events of `{self.url}` are not received anymore'))
+
+
+def _url(c: DockerClient) -> Optional[str]:
+    """:return: the URL of the daemon of a client created without one, from the base URL and socket of its API"""
+    api = getattr(c, 'api', None)
+    base_url = getattr(api, 'base_url', None)
+
+    if base_url is None:
+        return None
+
+    # the base URL of a local socket is always `http+docker://localhost`
+    adapter = getattr(api, '_custom_adapter', None)
+
+    if getattr(adapter, 'socket_path', None):
+        return 'unix://' + adapter.socket_path
+    elif getattr(adapter, 'npipe_path', None):
+        return 'npipe://' + adapter.npipe_path
+    elif base_url.startswith('http+docker://'):
+        return None
+
+    return base_url
+
+
+def _index(images: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    r = {}
+
+    for x in images:
+        r[x['Id']] = x
+
+        for tag in x.get('RepoTags') or []:
+            r[tag] = x
+
+    return r
+
+
+def _image(c: DockerClient, name: str) -> Optional[Dict[str, Any]]:
+    events = DockerEvents.of(c)
+
+    if events is None:
+        return _index(c.api.images()).get(name if name.startswith('sha256:') else Image.tag(name))
+
+    return events.image(c, name)
+
+
+def _wait(items: List[Tuple[DockerClient, Container]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    if any(DockerEvents.of(c) is None for c, _ in items):
+        return [c.api.wait(x['Id'], timeout=timeout) for c, x in items]
+
+    waits = []
+    deadline = None if timeout is None else time() + timeout
+
+    try:
+        for c, x in items:
+            events = DockerEvents.of(c)
+            waits.append((events, x['Id'], events.wait(c, x['Id'])))
+
+        return [fut.result(None if deadline is None else max(deadline - time(), 0)) for _, _, fut in waits]
+    except BaseException:
+        for events, ident, fut in waits:
+            events.discard(ident, fut)
+        raise
+
+
 @dataclass()
 class Docker(Op):
     conf: Op = field(default_factory=lambda: Var('docker'))
@@ -88,17 +400,53 @@ class Docker(Op):
     def dependencies(self) -> List['Op']:
         return [self.conf]
 
-    def execute(self, arg: Union[DockerClient, str]):
+    def execute(self, arg: Union[DockerClient, DockerHosts, str]):
         if isinstance(arg, str):
-            return DockerClientWrapper(DockerClient(arg))
+            return DockerClientWrapper(DockerClient(arg), arg)
         else:
             return arg
 
 
 class DockerOp(Op):
+    remote = True
+
+    broadcast = False
+    """Executed on every daemon of :class:`DockerHosts` unless bound to one"""
+
+    load = 0
+    """Change of the number of containers on the daemon the op is executed on"""
+
     def dependencies(self) -> List[Op]:
         return [Docker()]
 
+    def context_execute(self, ctx, c, *args):
+        if isinstance(c, DockerHosts):
+            r = self.execute_hosts(c)
+            return self.context_enter(ctx, r, c, *args), r
+
+        return super().context_execute(ctx, c, *args)
+
+    def execute_hosts(self, hosts: DockerHosts) -> Any:
+        return hosts.execute(self)
+
+    def host(self) -> Optional[str]:
+        """:return: the daemon of the containers, execs or networks the op is passed, if any"""
+        for x in self.__dict__.values():
+            if isinstance(x, (Container, Exec, Network)) and '_host' in x:
+                return x['_host']
+            elif isinstance(x, ContainerPool) and x.host is not None:
+                return x.host
+
+        return None
+
+    def placement_labels(self) -> Dict[str, str]:
+        """:return: the labels :meth:`DockerHosts.place` hashes, those of the containers of the pool passed if any"""
+        for x in self.__dict__.values():
+            if isinstance(x, ContainerPool):
+                return x.config.labels
+
+        return {}
+
     def execute(self, c: DockerClient):
         raise NotImplementedError('')
 
@@ -157,6 +505,10 @@ class ContainerConfig(Mappable):
                      network_disabled, entrypoint, working_dir, domainname, host_config, mac_address, labels,
                      stop_signal, networking_config, healthcheck, stop_timeout, runtime)
 
+    @property
+    def labels(self) -> Dict[str, str]:
+        return self.args[14] or {}
+
     def get(self, version, image, command) -> _CC:
         return _CC(version, image, command, *(x.get(version) if isinstance(x, Mappable) else x for x in self.args))
 
@@ -168,6 +520,11 @@ class ContainerCreate(DockerOp):
     command: List[str] = field(default_factory=list)
     config: ContainerConfig = field(default_factory=ContainerConfig)
 
+    load = 1
+
+    def placement_labels(self) -> Dict[str, str]:
+        return self.config.labels
+
     def execute(self, c: DockerClient):
         cfg = self.config.get(c.api.api_version, self.i['Id'], self.command)
 
@@ -184,6 +541,8 @@ class ContainerList(DockerOp):
     all: bool = True
     filters: Optional[Dict[str, Union[List[str], str]]] = None
 
+    broadcast = True
+
     def execute(self, c: DockerClient):
         return [Container(x) for x in c.api.containers(quiet=self.quiet, all=self.all, filters=self.filters)]
 
@@ -204,12 +563,53 @@ class ContainerRemove(DockerOp):
     link = False
     force = True
 
+    load = -1
+
     def execute(self, c: DockerClient):
         r = c.api.remove_container(self.c.id, self.v, self.link, self.force)
 
         return r
 
 
+@dataclass()
+class ContainerPrune(DockerOp):
+    """
+    Remove all of the containers matching ``filters`` (running ones included) with up to ``parallel`` requests at once.
+    The filters are required, so that the containers not created by the graph are not removed too.
+
+    :return: the containers removed
+    """
+    filters: Dict[str, Union[List[str], str]]
+    parallel: int = 8
+
+    broadcast = True
+
+    def __post_init__(self):
+        super().__post_init__(4)
+
+        if not self.filters:
+            raise ValueError('ContainerPrune requires non-empty filters: it would remove every container of the daemon')
+
+    def execute_hosts(self, hosts: DockerHosts) -> Any:
+        r = hosts.execute(self)
+
+        for x in r:
+            hosts.load[x['_host']] = max(hosts.load.get(x['_host'], 0) - 1, 0)
+
+        return r
+
+    def execute(self, c: DockerClient):
+        cs = [Container(x) for x in c.api.containers(all=True, filters=self.filters)]
+
+        if not len(cs):
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            list(pool.map(lambda x: c.api.remove_container(x['Id'], v=True, force=True), cs))
+
+        return cs
+
+
 @dataclass()
 class ContainerStart(DockerOp):
     c: Container
@@ -268,11 +668,24 @@ class ContainerWait(DockerOp):
         assert x1 not in ['running'], f'Status is {x1}'
         assert x2, 'Must be hydrated'
 
-        r = c.api.wait(self.c['Id'], timeout=self.timeout)
+        r, = _wait([(c, self.c)], self.timeout)
 
         return r
 
 
+@dataclass()
+class ContainerWaitAll(DockerOp):
+    """Wait for all of ``cs`` to stop; a single events subscription per daemon is shared by all of the waits"""
+    cs: List[Container]
+    timeout: Optional[float] = None
+
+    def execute_hosts(self, hosts: DockerHosts) -> Any:
+        return _wait([(hosts.client(x.get('_host', hosts.urls[0])), x) for x in self.cs], self.timeout)
+
+    def execute(self, c: DockerClient):
+        return _wait([(c, x) for x in self.cs], self.timeout)
+
+
 @dataclass()
 class ContainerCommit(DockerOp):
     c: Container
@@ -307,11 +720,43 @@ class ContainerPause(DockerOp):
 ContainerPutFiles = Dict[str, Tuple[tarfile.TarInfo, bytes]]
 
 
+COMPRESS_THRESHOLD = 1 << 20
+"""Size of the archives :class:`ContainerPut` compresses for the daemons that are not local"""
+
+COMPRESS_CHUNK = 1 << 20
+"""Size of the chunks of an archive compressed in parallel"""
+
+
+def _is_local(url: Optional[str]) -> bool:
+    if url is None:
+        return True
+
+    x = urlparse(url)
+
+    return x.scheme in ['unix', 'npipe'] or x.hostname in ['localhost', '127.0.0.1', '::1']
+
+
+def gzip_chunks(data: bytes, level: int = 6, threads: Optional[int] = None, chunk: int = COMPRESS_CHUNK):
+    """
+    Compress ``data`` as a gzip stream of the members compressed in parallel out of each ``chunk`` bytes
+
+    :return: an iterator of the members, in order
+    """
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        yield from pool.map(
+            lambda i: gzip.compress(data[i:i + chunk], level),
+            range(0, len(data), chunk)
+        )
+
+
 @dataclass()
 class ContainerPut(DockerOp):
     c: Container
     path: str
     files: ContainerPutFiles
+    compress: Optional[bool] = None
+    """Send the archive gzipped; by default if it is larger than ``COMPRESS_THRESHOLD`` and the daemon is not local"""
+    threads: Optional[int] = None
 
     @classmethod
     def tarinfos(cls, items: Dict[str, str], *, modes=0o644, time: Optional[datetime] = None) -> ContainerPutFiles:
@@ -372,7 +817,99 @@ class ContainerPut(DockerOp):
 
         file_like_object.seek(0)
 
-        return c.api.put_archive(self.c, self.path, file_like_object.getvalue())
+        data = file_like_object.getvalue()
+
+        if self.should_compress(c, len(data)):
+            data = gzip_chunks(data, threads=self.threads)
+
+        return c.api.put_archive(self.c, self.path, data)
+
+    def should_compress(self, c: DockerClient, size: int) -> bool:
+        if self.compress is not None:
+            return self.compress
+
+        return size >= COMPRESS_THRESHOLD and not _is_local(getattr(c, 'url', None) or _url(c))
+
+
+class _ChunksReader(io.RawIOBase):
+    """A file reading the byte chunks of an iterator"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.chunk = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not len(self.chunk):
+            try:
+                self.chunk = memoryview(next(self.chunks))
+            except StopIteration:
+                return 0
+
+        n = min(len(b), len(self.chunk))
+        b[:n] = self.chunk[:n]
+        self.chunk = self.chunk[n:]
+
+        return n
+
+
+@dataclass()
+class ContainerGet(DockerOp):
+    """
+    Extract ``path`` of the container into the directory ``dest`` as the archive is received, an entry at a time
+
+    :return: the paths of the files and links extracted
+    """
+    c: Container
+    path: str
+    dest: str
+    include: Optional[List[str]] = None
+    """``fnmatch`` patterns of the entries to extract, named as in the archive (e.g. ``tmp/*.txt`` for ``/tmp``)"""
+
+    def execute(self, c: DockerClient):
+        chunks, _ = c.api.get_archive(self.c['Id'], self.path)
+
+        dest = os.path.realpath(expanduser(self.dest))
+        r = []
+
+        with tarfile.open(fileobj=io.BufferedReader(_ChunksReader(chunks)), mode='r|*') as tar:
+            for member in tar:
+                if self.include is not None and not any(fnmatch(member.name, x) for x in self.include):
+                    continue
+
+                # the links extracted before are followed
+                parent = os.path.realpath(os.path.join(dest, os.path.dirname(member.name)))
+                name = os.path.basename(member.name)
+                target = os.path.join(parent, name)
+
+                if parent != dest and not parent.startswith(dest + os.sep) or name == '..':
+                    raise ValueError(f'Entry `{member.name}` is outside of `{self.dest}`')
+
+                if member.isdir() or name in ['', '.']:
+                    os.makedirs(target, exist_ok=True)
+                    continue
+
+                os.makedirs(parent, exist_ok=True)
+
+                if os.path.lexists(target) and not os.path.isdir(target):
+                    os.remove(target)
+
+                if member.isfile():
+                    with tar.extractfile(member) as src, open(target, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+
+                    os.chmod(target, member.mode & 0o777)
+                elif member.issym():
+                    os.symlink(member.linkname, target)
+                else:
+                    logging.getLogger(__name__).debug('Skipped `%s`', member.name)
+                    continue
+
+                r.append(target)
+
+        return r
 
 
 @dataclass()
@@ -394,31 +931,60 @@ class ImageList(DockerOp):
     all: bool = True
     filters: Optional[Dict[str, str]] = None
 
+    broadcast = True
+
     def execute(self, c: DockerClient):
         return [Image(x) for x in c.api.images(self.name, self.quiet, self.all, self.filters)]
 
 
+PULL_POLICIES = ['always', 'if-missing', 'never']
+
+
 @dataclass()
 class ImagePull(DockerOp):
+    """
+    :return: the image ``tag`` as listed by the daemon; the images present are looked up in an index of the daemon
+        shared by the ops, see :class:`DockerEvents`
+    """
     tag: str
     auth: Optional[DockerAuth] = None
+    policy: str = 'always'
+    """Pull ``always``, ``if-missing`` from the daemon or ``never``"""
+
+    broadcast = True
 
     def execute(self, c: DockerClient):
+        assert self.policy in PULL_POLICIES, f'Pull policy is {self.policy}'
+
+        if self.policy != 'always':
+            r = _image(c, self.tag)
+
+            if r is not None:
+                return Image(r)
+            elif self.policy == 'never':
+                raise LookupError(f'Image `{self.tag}` is not present and the pull policy is `never`')
+
         repo, tag = Image.tag(self.tag).split(':')
         auth_config = None
         if self.auth:
             auth_config = {'username': self.auth.username, 'password': self.auth.password}
 
-        stream = True
+        r = c.api.pull(repo, tag, auth_config=auth_config, stream=True, decode=True)
 
-        r = c.api.pull(repo, tag, auth_config=auth_config, stream=stream, decode=True)
+        for x in r:
+            logging.getLogger(__name__ + f'.{self.__class__.__name__}').debug('%s', x)
 
-        if stream:
-            for x in r:
-                logging.getLogger(__name__ + f'.{self.__class__.__name__}').debug('%s', x)
-            return Image({'Id': self.tag})
-        else:
-            return r
+        events = DockerEvents.of(c)
+
+        # the pull event could arrive after the image is looked up again
+        if events is not None:
+            events.invalidate()
+
+        r = _image(c, self.tag)
+
+        assert r is not None, f'Image `{self.tag}` is not present after the pull'
+
+        return Image(r)
 
 
 @dataclass()
@@ -426,6 +992,8 @@ class ImageTag(DockerOp):
     i: Image
     tag: str
 
+    broadcast = True
+
     def execute(self, c: DockerClient) -> TRes:
         repo, tag = Image.tag(self.tag).split(':')
         r = c.api.tag(self.i.id, repo, tag)
@@ -467,6 +1035,150 @@ class ExecStart(DockerOp):
             continue
 
 
+POOL_LABEL = 'xmake.pool'
+"""Label of the containers of a :class:`ContainerPool`, set to its ``ident``"""
+
+
+@dataclass
+class ContainerPool:
+    """
+    Started containers of ``image`` executing the commands of :class:`PoolExec`; a container is replaced by a new one
+    after ``uses`` commands. The pool is changed by its ops, so they are executed by the process holding it.
+
+    The containers are labelled with :data:`POOL_LABEL`; :class:`PoolStart` adds :meth:`close` to the teardowns of the
+    executor (see :func:`xmake.executor.at_teardown`), so they are removed if the graph fails before :class:`PoolStop`.
+
+    .. code-block:: python
+        :linenos:
+
+        pool = ContainerPool('alpine:3.5', size=4)
+
+        Executor().execute(
+            Seq(
+                lambda: PoolStart(pool),
+                Map(lambda cmd: Seq(lambda: PoolExec(pool, cmd)), [['make', 'a'], ['make', 'b']]),
+                lambda: PoolStop(pool),
+            )
+        )
+    """
+    image: str
+    size: int = 4
+    uses: int = 10
+    config: ContainerConfig = field(default_factory=ContainerConfig)
+    command: List[str] = field(default_factory=lambda: ['sleep', '2147483647'])
+    host: Optional[str] = None
+    """The daemon of the containers, see :class:`DockerHosts`"""
+    ident: str = field(default_factory=lambda: uuid4().hex)
+    idle: Deque[Container] = field(default_factory=deque, repr=False)
+    used: Dict[str, int] = field(default_factory=dict, repr=False)
+    client: Optional[DockerClient] = field(default=None, repr=False)
+
+    def start(self, c: DockerClient):
+        if self.host is None:
+            self.host = getattr(c, 'url', None)
+
+        self.client = c
+
+        while len(self.used) < self.size:
+            self._add(c)
+
+    def acquire(self, c: DockerClient) -> Container:
+        self.start(c)
+
+        if not len(self.idle):
+            self._add(c)
+
+        return self.idle.popleft()
+
+    def release(self, c: DockerClient, x: Container):
+        self.used[x['Id']] += 1
+
+        if self.used[x['Id']] < self.uses:
+            self.idle.append(x)
+        else:
+            self._remove(c, x['Id'])
+            self._add(c)
+
+    def stop(self, c: DockerClient) -> int:
+        r = len(self.used)
+
+        for ident in list(self.used):
+            self._remove(c, ident)
+
+        self.idle.clear()
+
+        return r
+
+    def close(self):
+        """Remove the containers of the pool, the ones it had not finished starting included"""
+        if self.client is None:
+            return
+
+        for x in self.client.api.containers(all=True, filters={'label': f'{POOL_LABEL}={self.ident}'}):
+            self.client.api.remove_container(x['Id'], force=True)
+
+        self.used.clear()
+        self.idle.clear()
+
+    def _add(self, c: DockerClient):
+        cfg = self.config.get(c.api.api_version, self.image, self.command)
+        cfg['Labels'] = {**(cfg.get('Labels') or {}), POOL_LABEL: self.ident}
+
+        x = Container(c.api.create_container_from_config(cfg))
+        c.api.start(x['Id'])
+
+        self.used[x['Id']] = 0
+        self.idle.append(x)
+
+    def _remove(self, c: DockerClient, ident: str):
+        c.api.remove_container(ident, force=True)
+        del self.used[ident]
+
+
+@dataclass()
+class PoolStart(DockerOp):
+    pool: ContainerPool
+
+    remote = False
+
+    def execute(self, c: DockerClient):
+        at_teardown(self.pool.close)
+        self.pool.start(c)
+        return self.pool
+
+
+@dataclass()
+class PoolExec(DockerOp):
+    """:return: the exit code and the output of ``command`` executed in a container of ``pool``"""
+    pool: ContainerPool
+    command: List[str]
+
+    remote = False
+
+    def execute(self, c: DockerClient):
+        x = self.pool.acquire(c)
+
+        try:
+            e = c.api.exec_create(x['Id'], self.command)
+            output = c.api.exec_start(e['Id'])
+            exit_code = c.api.exec_inspect(e['Id'])['ExitCode']
+        finally:
+            self.pool.release(c, x)
+
+        return {'ExitCode': exit_code, 'Output': output}
+
+
+@dataclass()
+class PoolStop(DockerOp):
+    """Remove the containers of ``pool``; :return: their number"""
+    pool: ContainerPool
+
+    remote = False
+
+    def execute(self, c: DockerClient):
+        return self.pool.stop(c)
+
+
 @dataclass()
 class NetworkCreate(DockerOp):
     n: Network
@@ -476,6 +1188,9 @@ class NetworkCreate(DockerOp):
     labels: Optional[Dict[str, str]] = None
     kwargs: Dict[str, Any] = field(default_factory=dict)
 
+    def placement_labels(self) -> Dict[str, str]:
+        return self.labels or {}
+
     def execute(self, c: DockerClient):
         assert self.n.get('Id') is None, 'Must not be hydrated'
 
@@ -0,0 +1,142 @@
+import logging
+import random
+from typing import Any, List, Callable, Set
+
+from dataclasses import dataclass, field
+
+from xmake.runtime import JobRec, Step
+
+
+class LazyLog:
+    def __init__(self, callable):
+        self.callable = callable
+
+    def __str__(self) -> str:
+        return self.callable()
+
+
+class Tracer:
+    """
+    Subscriber to the events emitted by :class:`xmake.executor.Executor`.
+
+    The executor only calls into tracers when at least one is attached, so every method here is allowed to be
+    arbitrarily expensive. Override only the events you are interested in.
+
+    .. code-block:: python
+        :linenos:
+
+        class Slow(Tracer):
+            def finished(self, rec, ret, elapsed):
+                if elapsed > 1.:
+                    print(rec.ident, rec.step, rec.job)
+
+        Executor(tracers=[Slow()]).execute(...)
+    """
+
+    def scheduled(self, rec: JobRec):
+        """A new job had been put into the dependency graph (always at ``Step.Deps``)"""
+
+    def started(self, rec: JobRec, deps: List[JobRec]):
+        """A step of a job is about to be executed"""
+
+    def finished(self, rec: JobRec, ret: Any, elapsed: float):
+        """A step of a job had returned ``ret`` after ``elapsed`` seconds"""
+
+    def failed(self, rec: JobRec, e: Exception, elapsed: float):
+        """A step of a job had raised ``e`` after ``elapsed`` seconds"""
+
+
+@dataclass
+class Filtered(Tracer):
+    """Forward events of the jobs matching ``predicate`` only"""
+
+    tracer: Tracer
+    predicate: Callable[[JobRec], bool]
+
+    def scheduled(self, rec: JobRec):
+        if self.predicate(rec):
+            self.tracer.scheduled(rec)
+
+    def started(self, rec: JobRec, deps: List[JobRec]):
+        if self.predicate(rec):
+            self.tracer.started(rec, deps)
+
+    def finished(self, rec: JobRec, ret: Any, elapsed: float):
+        if self.predicate(rec):
+            self.tracer.finished(rec, ret, elapsed)
+
+    def failed(self, rec: JobRec, e: Exception, elapsed: float):
+        if self.predicate(rec):
+            self.tracer.failed(rec, e, elapsed)
+
+
+@dataclass
+class Sampled(Filtered):
+    """Forward events of a random ``rate`` fraction of the jobs; all steps of a sampled job are forwarded"""
+
+    predicate: Callable[[JobRec], bool] = None
+    rate: float = 0.01
+    seed: Any = None
+    rnd: random.Random = field(init=False, repr=False)
+    sampled: Set[int] = field(init=False, repr=False, default_factory=set)
+
+    def __post_init__(self):
+        self.rnd = random.Random(self.seed)
+        self.predicate = self._is_sampled
+
+    def _is_sampled(self, rec: JobRec) -> bool:
+        return rec.ident in self.sampled
+
+    def scheduled(self, rec: JobRec):
+        if self.rnd.random() < self.rate:
+            self.sampled.add(rec.ident)
+
+        super().scheduled(rec)
+
+    def finished(self, rec: JobRec, ret: Any, elapsed: float):
+        super().finished(rec, ret, elapsed)
+
+        if rec.step == Step.Result:
+            self.sampled.discard(rec.ident)
+
+    def failed(self, rec: JobRec, e: Exception, elapsed: float):
+        super().failed(rec, e, elapsed)
+
+        # the execution stops at the first failure, the job never reaches its result
+        self.sampled.discard(rec.ident)
+
+
+def _fmt_deps(deps: List[JobRec]) -> str:
+    return ', '.join(repr(x.job) for x in deps)
+
+
+def _fmt_mappings(rec: JobRec, max_len=60) -> str:
+    return ', '.join(f'{k}={repr(v)[:max_len]}' for k, v in rec.ctx.mappings)
+
+
+@dataclass
+class LogTracer(Tracer):
+    """
+    Emit the events to python logging; every argument is formatted lazily so that nothing is computed unless the
+    logger is enabled for ``level``.
+    """
+
+    name: str = 'xmake.executor'
+    level: int = logging.DEBUG
+
+    def __post_init__(self):
+        self.logger = logging.getLogger(self.name)
+
+    def started(self, rec: JobRec, deps: List[JobRec]):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, '[+] %s %s -> { %s }', rec.id, rec.job, LazyLog(lambda: _fmt_deps(deps)))
+            self.logger.log(self.level, '[=] %s', LazyLog(lambda: _fmt_mappings(rec)))
+
+    def finished(self, rec: JobRec, ret: Any, elapsed: float):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, '[-] %s %.6f', rec.id, elapsed)
+            self.logger.log(self.level, '[_] %s', LazyLog(lambda: repr(ret)[:120]))
+
+    def failed(self, rec: JobRec, e: Exception, elapsed: float):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, '[!] %s %.6f %s', rec.id, elapsed, e)
@@ -37,12 +37,15 @@ def _iter_idx(iter_obj, nth):
             return x
 
 
-def _get_caller(depth=2, stdlib_impl=True) -> inspect.FrameInfo:
+def _get_caller(depth=2, stdlib_impl=False) -> inspect.FrameInfo:
     """Get caller frame"""
     if stdlib_impl:
         caller = inspect.stack()[depth]
     else:
-        caller = _iter_idx(_get_stack(), depth)
+        # inspect.stack() reads the source lines of every frame on the stack, we only need the location of one
+        frame = sys._getframe(depth)
+        code = frame.f_code
+        caller = inspect.FrameInfo(frame, code.co_filename, frame.f_lineno, code.co_name, None, None)
     return caller
 
 
@@ -0,0 +1,839 @@
+"""
+In-process fake of the Docker Engine API, used by the tests and the benchmarks in place of a daemon.
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+import queue
+import re
+import shlex
+import socketserver
+import struct
+import tarfile
+import tempfile
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler
+from itertools import count
+from time import sleep
+from typing import Dict, List, Optional, Tuple, Callable, Any
+from urllib.parse import urlparse, parse_qs
+
+from dataclasses import dataclass, field
+
+API_VERSION = '1.41'
+
+STDOUT = 1
+STDERR = 2
+
+RunResult = Optional[Tuple[int, bytes]]
+Runner = Callable[[List[str]], RunResult]
+
+
+def default_runner(cmd: List[str]) -> RunResult:
+    """
+    Pretend to run ``cmd``; understands ``echo``, ``true``, ``false``, ``exit N`` and ``sleep`` (which runs until the
+    container is killed) optionally wrapped in ``sh -c`` and chained with ``;`` or ``&&``.
+
+    :return: ``None`` if the command does not exit by itself, otherwise the exit code and the output
+    """
+    if cmd[:2] == ['sh', '-c']:
+        cmd = shlex.split(' '.join(cmd[2:]).replace('&&', ';'))
+
+    output = b''
+
+    cmds = [[]]
+
+    for x in cmd:
+        if x == ';':
+            cmds.append([])
+        elif x.endswith(';'):
+            cmds[-1].append(x[:-1])
+            cmds.append([])
+        else:
+            cmds[-1].append(x)
+
+    for x in (y for y in cmds if y):
+        name, *args = x
+
+        if name == 'echo':
+            output += ' '.join(args).encode() + b'\n'
+        elif name == 'true':
+            pass
+        elif name == 'false':
+            return 1, output
+        elif name == 'exit':
+            return int(args[0]) if args else 0, output
+        elif name == 'sleep':
+            return None
+        else:
+            return 127, output + f'{name}: not found\n'.encode()
+
+    return 0, output
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _ident(*parts: Any) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def _image_event(action: str, name: str) -> Dict[str, Any]:
+    return {
+        'status': action,
+        'id': name,
+        'Type': 'image',
+        'Action': action,
+        'Actor': {'ID': name, 'Attributes': {'name': name}},
+        'time': int(datetime.now().timestamp()),
+    }
+
+
+def frame(stream: int, data: bytes) -> bytes:
+    """Encode ``data`` as a single frame of a multiplexed docker stream"""
+    return struct.pack('>BxxxL', stream, len(data)) + data
+
+
+class FakeError(Exception):
+    def __init__(self, status: int, message: str):
+        self.status = status
+        self.message = message
+        super().__init__(status, message)
+
+
+@dataclass
+class FakeContainer:
+    id: str
+    name: str
+    image: str
+    cmd: List[str]
+    labels: Dict[str, str]
+    config: Dict[str, Any]
+    created: float
+    status: str = 'created'
+    exit_code: int = 0
+    output: bytes = b''
+    files: Dict[str, Tuple[tarfile.TarInfo, bytes]] = field(default_factory=dict, repr=False)
+    exited: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def running(self) -> bool:
+        return self.status in ['running', 'paused']
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'Id': self.id,
+            'Names': ['/' + self.name],
+            'Image': self.image,
+            'Command': ' '.join(shlex.quote(x) for x in self.cmd),
+            'Created': int(self.created),
+            'Labels': self.labels,
+            'State': self.status,
+            'Status': self.status,
+        }
+
+    def inspect(self) -> Dict[str, Any]:
+        return {
+            'Id': self.id,
+            'Name': '/' + self.name,
+            'Image': self.image,
+            'Config': {**self.config, 'Image': self.image, 'Cmd': self.cmd, 'Labels': self.labels},
+            'State': {
+                'Status': self.status,
+                'Running': self.running,
+                'Paused': self.status == 'paused',
+                'ExitCode': self.exit_code,
+            },
+        }
+
+
+@dataclass
+class FakeExec:
+    id: str
+    container: FakeContainer
+    cmd: List[str]
+    exit_code: Optional[int] = None
+    running: bool = False
+
+
+@dataclass
+class FakeDocker:
+    """
+    In-memory state of a fake Docker daemon served by :class:`FakeDockerServer`.
+
+    :param latency: seconds to sleep before answering any request
+    :param latencies: per-endpoint overrides of ``latency``, keyed by the handler name (e.g. ``container_wait``)
+    :param runner: decides what the started containers and execs print and return, see :func:`default_runner`
+    """
+
+    latency: float = 0.
+    latencies: Dict[str, float] = field(default_factory=dict)
+    runner: Runner = default_runner
+
+    images: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    containers: Dict[str, FakeContainer] = field(default_factory=dict)
+    execs: Dict[str, FakeExec] = field(default_factory=dict)
+    requests: Dict[str, int] = field(default_factory=dict)
+    subscribers: List[queue.Queue] = field(default_factory=list, repr=False)
+    lock: threading.RLock = field(default_factory=threading.RLock, repr=False)
+
+    def __post_init__(self):
+        self._ids = count()
+
+    def next_id(self, *parts: Any) -> str:
+        return _ident(next(self._ids), *parts)
+
+    def tick(self, name: str):
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+        latency = self.latencies.get(name, self.latency)
+
+        if latency:
+            sleep(latency)
+
+    def image(self, name: str) -> Dict[str, Any]:
+        if ':' not in name and not name.startswith('sha256'):
+            name += ':latest'
+
+        for image in self.images.values():
+            if image['Id'] == name or name in image['RepoTags']:
+                return image
+
+        raise FakeError(404, f'No such image: {name}')
+
+    def container(self, ident: str) -> FakeContainer:
+        for c in self.containers.values():
+            if c.id == ident or c.id.startswith(ident) or c.name == ident.lstrip('/'):
+                return c
+
+        raise FakeError(404, f'No such container: {ident}')
+
+    def run(self, c: FakeContainer):
+        r = self.runner(c.cmd)
+
+        if r is not None:
+            self.exit(c, *r)
+
+    def exit(self, c: FakeContainer, exit_code: int, output: bytes = b''):
+        c.output += output
+        c.exit_code = exit_code
+        c.status = 'exited'
+        c.exited.set()
+
+        self.publish({
+            'status': 'die',
+            'id': c.id,
+            'from': c.image,
+            'Type': 'container',
+            'Action': 'die',
+            'Actor': {'ID': c.id, 'Attributes': {'exitCode': str(exit_code), 'name': c.name, **c.labels}},
+            'time': int(datetime.now().timestamp()),
+        })
+
+    def publish(self, event: Dict[str, Any]):
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for x in subscribers:
+            x.put(event)
+
+    def close(self):
+        """End the event streams and unblock the requests waiting for the containers"""
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+
+        for x in subscribers:
+            x.put(None)
+
+        for c in list(self.containers.values()):
+            c.exited.set()
+
+
+def _match_filters(c: FakeContainer, filters: Dict[str, List[str]]) -> bool:
+    for name, values in filters.items():
+        if isinstance(values, dict):
+            values = [k for k, v in values.items() if v]
+
+        for value in values:
+            if name == 'label':
+                k, *v = value.split('=', 1)
+                if k not in c.labels or (v and c.labels[k] != v[0]):
+                    return False
+            elif name == 'name':
+                if not re.search(value, c.name):
+                    return False
+            elif name == 'id':
+                if not c.id.startswith(value):
+                    return False
+            elif name == 'status':
+                if c.status != value:
+                    return False
+            else:
+                raise FakeError(400, f'Invalid filter {name}')
+    return True
+
+
+ROUTES = []
+
+
+def route(method: str, pattern: str):
+    def wrapper(fn):
+        ROUTES.append((method, re.compile('^' + pattern + '$'), fn))
+        return fn
+
+    return wrapper
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'FakeDockerServer'
+
+    @property
+    def docker(self) -> FakeDocker:
+        return self.server.docker
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format, *args)
+
+    def address_string(self):
+        return str(self.client_address)
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        path = re.sub(r'^/v[0-9.]+', '', url.path)
+
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            self.body = self._read_chunked()
+
+        for route_method, route_re, fn in ROUTES:
+            m = route_re.match(path)
+
+            if route_method == method and m:
+                try:
+                    self.docker.tick(fn.__name__)
+                    fn(self, *m.groups())
+                except FakeError as e:
+                    self.send_json({'message': e.message}, e.status)
+                return
+
+        self.send_json({'message': f'page not found: {method} {path}'}, 404)
+
+    def _read_chunked(self) -> bytes:
+        r = b''
+
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+
+            if size == 0:
+                self.rfile.readline()
+                return r
+
+            r += self.rfile.read(size)
+            self.rfile.readline()
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def do_HEAD(self):
+        self._dispatch('HEAD')
+
+    def send_body(self, body: bytes, status: int = 200, content_type: str = 'application/json',
+                  headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Api-Version', API_VERSION)
+
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+
+        self.end_headers()
+
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_json(self, obj: Any, status: int = 200):
+        self.send_body(json.dumps(obj).encode(), status)
+
+    def send_empty(self, status: int = 204):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_chunked(self, chunks, content_type: str = 'application/json'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        for chunk in chunks:
+            self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+            self.wfile.flush()
+
+        self.wfile.write(b'0\r\n\r\n')
+
+    def send_raw_stream(self, data: bytes):
+        """Answer with a hijacked raw stream, as ``exec_start`` and ``attach`` are read directly from the socket"""
+        self.close_connection = True
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.docker.raw-stream')
+        self.end_headers()
+        self.wfile.flush()
+
+        # the client reads the body bypassing the buffer of the headers, so they should not arrive together
+        sleep(0.005)
+
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def query_bool(self, name: str, default=False) -> bool:
+        v = self.query.get(name)
+
+        if v is None:
+            return default
+
+        return v.lower() in ['1', 'true']
+
+    def query_filters(self) -> Dict[str, List[str]]:
+        return json.loads(self.query.get('filters') or '{}')
+
+    def json(self) -> Any:
+        return json.loads(self.body or b'{}')
+
+    # system
+
+    @route('GET', '/events')
+    def events(self):
+        filters = self.query_filters()
+        q = queue.Queue()
+
+        with self.docker.lock:
+            self.docker.subscribers.append(q)
+
+        def chunks():
+            while True:
+                event = q.get()
+
+                if event is None:
+                    return
+
+                matches = [event[k] in filters.get(name, [event[k]]) for name, k in [('type', 'Type'), ('event', 'Action')]]
+
+                if all(matches):
+                    yield json.dumps(event).encode() + b'\n'
+
+        try:
+            self.send_chunked(chunks())
+        except (BrokenPipeError, ConnectionResetError):
+            # the subscriber closed the stream
+            self.close_connection = True
+        finally:
+            with self.docker.lock:
+                if q in self.docker.subscribers:
+                    self.docker.subscribers.remove(q)
+
+    @route('GET', '/_ping')
+    def ping(self):
+        self.send_body(b'OK', content_type='text/plain')
+
+    @route('GET', '/version')
+    def version(self):
+        self.send_json({'ApiVersion': API_VERSION, 'MinAPIVersion': '1.12', 'Version': '20.10.0-fake'})
+
+    # containers
+
+    @route('POST', '/containers/create')
+    def container_create(self):
+        cfg = self.json()
+        docker = self.docker
+
+        with docker.lock:
+            image = docker.image(cfg['Image'])
+
+            ident = docker.next_id('container')
+            name = self.query.get('name') or ident[:12]
+
+            if any(c.name == name for c in docker.containers.values()):
+                raise FakeError(409, f'Conflict. The container name "/{name}" is already in use')
+
+            cmd = cfg.get('Cmd') or image.get('Cmd') or []
+
+            if isinstance(cmd, str):
+                cmd = shlex.split(cmd)
+
+            docker.containers[ident] = FakeContainer(
+                id=ident,
+                name=name,
+                image=cfg['Image'],
+                cmd=cmd,
+                labels=cfg.get('Labels') or {},
+                config={'Tty': bool(cfg.get('Tty'))},
+                created=datetime.now().timestamp(),
+            )
+
+        self.send_json({'Id': ident, 'Warnings': []}, 201)
+
+    @route('GET', '/containers/json')
+    def container_list(self):
+        filters = self.query_filters()
+        include_all = self.query_bool('all')
+
+        with self.docker.lock:
+            r = [
+                c.summary() for c in self.docker.containers.values()
+                if (include_all or c.running) and _match_filters(c, filters)
+            ]
+
+        self.send_json(r)
+
+    @route('GET', '/containers/([^/]+)/json')
+    def container_inspect(self, ident):
+        self.send_json(self.docker.container(ident).inspect())
+
+    @route('POST', '/containers/([^/]+)/start')
+    def container_start(self, ident):
+        c = self.docker.container(ident)
+
+        if c.running:
+            return self.send_empty(304)
+
+        c.status = 'running'
+        c.exited.clear()
+        self.docker.run(c)
+        self.send_empty()
+
+    @route('POST', '/containers/([^/]+)/wait')
+    def container_wait(self, ident):
+        c = self.docker.container(ident)
+        c.exited.wait()
+        self.send_json({'StatusCode': c.exit_code, 'Error': None})
+
+    @route('POST', '/containers/([^/]+)/(?:kill|stop)')
+    def container_kill(self, ident):
+        c = self.docker.container(ident)
+
+        if not c.running:
+            raise FakeError(409, f'Container {ident} is not running')
+
+        self.docker.exit(c, 137)
+        self.send_empty()
+
+    @route('POST', '/containers/([^/]+)/pause')
+    def container_pause(self, ident):
+        c = self.docker.container(ident)
+        c.status = 'paused'
+        self.send_empty()
+
+    @route('DELETE', '/containers/([^/]+)')
+    def container_remove(self, ident):
+        c = self.docker.container(ident)
+
+        if c.running:
+            if not self.query_bool('force'):
+                raise FakeError(409, f'You cannot remove a running container {c.id}')
+
+            self.docker.exit(c, 137)
+
+        with self.docker.lock:
+            del self.docker.containers[c.id]
+
+        self.send_empty()
+
+    @route('GET', '/containers/([^/]+)/logs')
+    def container_logs(self, ident):
+        c = self.docker.container(ident)
+
+        r = b''
+
+        if self.query_bool('stdout'):
+            for line in c.output.splitlines(keepends=True):
+                if self.query_bool('timestamps'):
+                    line = _now().encode() + b' ' + line
+                r += frame(STDOUT, line)
+
+        self.send_body(r, content_type='application/vnd.docker.multiplexed-stream')
+
+    @route('POST', '/containers/([^/]+)/attach')
+    def container_attach(self, ident):
+        c = self.docker.container(ident)
+        c.exited.wait()
+        self.send_raw_stream(frame(STDOUT, c.output) if c.output else b'')
+
+    @route('POST', '/commit')
+    def container_commit(self):
+        c = self.docker.container(self.query['container'])
+
+        ident = 'sha256:' + self.docker.next_id('image', c.id)
+        tags = []
+
+        if self.query.get('repo'):
+            tags.append(f'{self.query["repo"]}:{self.query.get("tag") or "latest"}')
+
+        with self.docker.lock:
+            self.docker.images[ident] = {'Id': ident, 'RepoTags': tags, 'Cmd': c.cmd, 'Created': 0, 'Size': 0}
+
+        self.send_json({'Id': ident}, 201)
+
+    @route('PUT', '/containers/([^/]+)/archive')
+    def container_put_archive(self, ident):
+        c = self.docker.container(ident)
+        path = self.query.get('path', '/')
+
+        with tarfile.open(fileobj=io.BytesIO(self.body), mode='r:*') as tar:
+            for member in tar.getmembers():
+                contents = tar.extractfile(member).read() if member.isfile() else b''
+                dest = posixpath.normpath(posixpath.join(path, member.name))
+                c.files[dest] = (member, contents)
+
+        self.send_empty(200)
+
+    @route('GET', '/containers/([^/]+)/archive')
+    def container_get_archive(self, ident):
+        c = self.docker.container(ident)
+        path = posixpath.normpath(self.query.get('path', '/'))
+        base = posixpath.basename(path)
+
+        files = [(k, v) for k, v in sorted(c.files.items()) if k == path or k.startswith(path.rstrip('/') + '/')]
+
+        if not len(files):
+            raise FakeError(404, f'Could not find the file {path} in container {ident}')
+
+        body = io.BytesIO()
+
+        with tarfile.open(fileobj=body, mode='w') as tar:
+            for dest, (info, contents) in files:
+                member = tarfile.TarInfo(base if dest == path else posixpath.join(base, posixpath.relpath(dest, path)))
+                member.size = len(contents)
+                member.mode = info.mode
+                tar.addfile(member, io.BytesIO(contents))
+
+        data = body.getvalue()
+        stat = {'name': base, 'size': len(data), 'mode': 0o40755 if files[0][0] != path else 0o644}
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-tar')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Docker-Container-Path-Stat', base64.b64encode(json.dumps(stat).encode()).decode())
+        self.end_headers()
+
+        # sent in parts, as a daemon streams the archive
+        for i in range(0, len(data), 4096):
+            self.wfile.write(data[i:i + 4096])
+
+    # execs
+
+    @route('POST', '/containers/([^/]+)/exec')
+    def exec_create(self, ident):
+        c = self.docker.container(ident)
+
+        if not c.running:
+            raise FakeError(409, f'Container {c.id} is not running')
+
+        cmd = self.json()['Cmd']
+
+        if isinstance(cmd, str):
+            cmd = shlex.split(cmd)
+
+        e = FakeExec(self.docker.next_id('exec'), c, cmd)
+
+        with self.docker.lock:
+            self.docker.execs[e.id] = e
+
+        self.send_json({'Id': e.id}, 201)
+
+    @route('POST', '/exec/([^/]+)/start')
+    def exec_start(self, ident):
+        try:
+            e = self.docker.execs[ident]
+        except KeyError:
+            raise FakeError(404, f'No such exec instance: {ident}')
+
+        e.running = True
+        r = self.docker.runner(e.cmd)
+        e.running = False
+
+        exit_code, output = r if r is not None else (0, b'')
+        e.exit_code = exit_code
+
+        self.send_raw_stream(frame(STDOUT, output) if output else b'')
+
+    @route('GET', '/exec/([^/]+)/json')
+    def exec_inspect(self, ident):
+        try:
+            e = self.docker.execs[ident]
+        except KeyError:
+            raise FakeError(404, f'No such exec instance: {ident}')
+
+        self.send_json({'ID': e.id, 'Running': e.running, 'ExitCode': e.exit_code, 'ContainerID': e.container.id})
+
+    # images
+
+    @route('POST', '/images/create')
+    def image_pull(self):
+        repo = self.query['fromImage']
+        tag = self.query.get('tag') or 'latest'
+        name = f'{repo}:{tag}'
+
+        with self.docker.lock:
+            try:
+                image = self.docker.image(name)
+            except FakeError:
+                image = {'Id': 'sha256:' + _ident('image', name), 'RepoTags': [name], 'Created': 0, 'Size': 0}
+                self.docker.images[image['Id']] = image
+
+        self.docker.publish(_image_event('pull', name))
+
+        self.send_chunked([
+            json.dumps({'status': f'Pulling from library/{repo}', 'id': tag}).encode() + b'\r\n',
+            json.dumps({'status': f'Digest: {image["Id"]}'}).encode() + b'\r\n',
+            json.dumps({'status': f'Status: Image is up to date for {name}'}).encode() + b'\r\n',
+        ])
+
+    @route('GET', '/images/json')
+    def image_list(self):
+        filters = self.query_filters()
+        references = filters.get('reference', [])
+
+        if self.query.get('filter'):
+            references.append(self.query['filter'])
+
+        with self.docker.lock:
+            r = [
+                x for x in self.docker.images.values()
+                if not references or any(
+                    ref == t or ref == t.split(':')[0] for t in x['RepoTags'] for ref in references)
+            ]
+
+        self.send_json(r)
+
+    @route('POST', '/images/(.+)/tag')
+    def image_tag(self, name):
+        image = self.docker.image(name)
+
+        with self.docker.lock:
+            image['RepoTags'].append(f'{self.query["repo"]}:{self.query.get("tag") or "latest"}')
+
+        self.docker.publish(_image_event('tag', image['Id']))
+        self.send_empty(201)
+
+    # networks
+
+    @route('POST', '/networks/create')
+    def network_create(self):
+        self.send_json({'Id': self.docker.next_id('network'), 'Warning': ''}, 201)
+
+    @route('POST', '/networks/([^/]+)/connect')
+    def network_connect(self, ident):
+        self.docker.container(self.json()['Container'])
+        self.send_empty(200)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # connecting to a unix socket with a full backlog fails instead of being retried
+    request_queue_size = 128
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class FakeDockerServer:
+    """
+    In-process fake of the Docker Engine API listening on a unix socket (or on a local TCP port if ``tcp=True``).
+
+    .. code-block:: python
+        :linenos:
+
+        with FakeDockerServer() as server:
+            Executor().execute(
+                With(
+                    server.url,
+                    lambda docker: ImagePull('alpine:3.5')
+                )
+            )
+    """
+
+    def __init__(self, docker: Optional[FakeDocker] = None, path: Optional[str] = None, tcp=False,
+                 poll_interval: float = 0.01):
+        """
+        :param poll_interval: of the serving thread, bounding how long :meth:`stop` waits for it
+        """
+        self.docker = FakeDocker() if docker is None else docker
+        self.tmp_dir = None
+        self.tcp = tcp
+        self.poll_interval = poll_interval
+
+        if path is None and not tcp:
+            self.tmp_dir = tempfile.TemporaryDirectory()
+            path = os.path.join(self.tmp_dir.name, 'docker.sock')
+
+        self.path = path
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        if self.tcp:
+            host, port = self.server.server_address
+            return f'tcp://{host}:{port}'
+        else:
+            return f'unix://{self.path}'
+
+    def start(self) -> 'FakeDockerServer':
+        if self.tcp:
+            self.server = _TCPServer(('127.0.0.1', 0), Handler)
+        else:
+            self.server = _UnixServer(self.path, Handler)
+
+        self.server.docker = self.docker
+
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            args=(self.poll_interval,),
+            name=f'{self.__class__.__name__}',
+            daemon=True
+        )
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+        self.docker.close()
+
+        if self.tmp_dir:
+            self.tmp_dir.cleanup()
+
+    def __enter__(self) -> 'FakeDockerServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
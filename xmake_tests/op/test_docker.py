@@ -1,33 +1,42 @@
+import io
+import os
+import tarfile
+import tempfile
+import threading
 import unittest
-from time import sleep
+import zlib
+from time import sleep, time
+from types import SimpleNamespace
 
-from xmake.dsl import With, Con, Seq, Match, Err, Case, Fil, Map, Eval
+from docker import DockerClient, from_env
+
+from xmake.dsl import With, Con, Seq, Match, Err, Case, Fil, Map, Eval, Loc
+from xmake.error import ExecError
 from xmake.executor import Executor
 from xmake.op.docker import ImagePull, ContainerStart, ContainerCreate, ContainerConfig, ContainerRemove, ContainerList, \
-    ContainerLogs, ContainerWait
+    ContainerLogs, ContainerWait, ImageList, ImageTag, ExecCreate, ExecStart, ContainerPut, DockerHosts, \
+    ContainerWaitAll, ContainerPool, PoolStart, PoolExec, PoolStop, ContainerPrune, COMPRESS_THRESHOLD, \
+    ContainerGet, Container, DockerEvents, NetworkCreate, Network
+from xmake_tests.op.fake_docker import FakeDockerServer
 
 
 class TestImage(unittest.TestCase):
     def setUp(self):
-        Executor(should_trace=True).execute(
+        self.server = FakeDockerServer().start()
+        self.clean()
+
+    def clean(self):
+        return Executor(should_trace=True).execute(
             With(
-                'unix:///var/run/docker.sock',
-                lambda docker: Map(
-                    lambda x: Seq(
-                        lambda: ContainerRemove(x)
-                    ),
-                    Fil(
-                        lambda x: x,
-                        ContainerList(filters={'label': 'test'})
-                    )
-                )
+                self.server.url,
+                lambda docker: ContainerPrune(filters={'label': 'test'})
             )
         )
 
     def test_start(self):
         cmd = ['sh', '-c', 'echo asd']
         expr = With(
-            'unix:///var/run/docker.sock',
+            self.server.url,
             lambda docker: With(
                 ImagePull('alpine:3.5'),
                 lambda i: With(
@@ -78,7 +87,6 @@ class TestImage(unittest.TestCase):
                         lambda: Seq(
                             lambda: Eval(lambda: sleep(1)),
                         ),
-                        # todo this will hang if the container managed to stop before it's called
                         lambda: ContainerWait(c),
                         lambda: ContainerLogs(c),
                         lambda: ContainerRemove(c),
@@ -91,11 +99,12 @@ class TestImage(unittest.TestCase):
 
         r = Executor(should_trace=True).execute(expr)
 
-        print(r)
+        self.assertIn('Id', r)
+        self.assertEqual({}, self.server.docker.containers)
 
     def test_image(self):
         expr = With(
-            Con('unix:///var/run/docker.sock'),
+            Con(self.server.url),
             lambda docker: Seq(
                 ImagePull('alpine:3.5')
             )
@@ -103,9 +112,455 @@ class TestImage(unittest.TestCase):
 
         r = Executor(should_trace=True).execute(expr)
 
-        print(
-            r
+        self.assertEqual(self.server.docker.image('alpine:3.5')['Id'], r['Id'])
+        self.assertEqual('Image', r['_type'])
+
+    def test_image_policy(self):
+        def pull(policy, tag='alpine:3.5'):
+            return With(
+                self.server.url,
+                lambda docker: Map(
+                    lambda x: ImagePull(tag, policy=policy),
+                    list(range(5))
+                )
+            )
+
+        with self.assertRaises(ExecError) as e:
+            Executor().execute(pull('never'))
+
+        self.assertIsInstance(e.exception.e, LookupError)
+
+        r = Executor().execute(pull('if-missing'))
+
+        self.assertEqual(1, len({x['Id'] for x in r}))
+        self.assertEqual(1, self.server.docker.requests['image_pull'])
+
+        Executor().execute(pull('always'))
+
+        self.assertEqual(6, self.server.docker.requests['image_pull'])
+
+        # the tag is found in the index reloaded after the tag event
+        Executor().execute(With(self.server.url, lambda docker: Seq(lambda: ImageTag(r[0], 'xmake:policy'))))
+
+        for _ in range(100):
+            try:
+                Executor().execute(With(self.server.url, lambda docker: ImagePull('xmake:policy', policy='never')))
+                break
+            except ExecError:
+                sleep(0.01)
+        else:
+            self.fail('The tag is not found')
+
+        self.assertEqual(6, self.server.docker.requests['image_pull'])
+
+    def test_image_tag(self):
+        expr = With(
+            self.server.url,
+            lambda docker: With(
+                ImagePull('alpine:3.5'),
+                lambda i: Seq(
+                    lambda: ImageTag(i, 'xmake:test'),
+                    ImageList(),
+                )
+            )
+        )
+
+        r = Executor(should_trace=True).execute(expr)
+
+        self.assertEqual([['alpine:3.5', 'xmake:test']], [x['RepoTags'] for x in r])
+
+    def test_exec(self):
+        expr = With(
+            self.server.url,
+            lambda docker: With(
+                ImagePull('alpine:3.5'),
+                lambda i: With(
+                    lambda: ContainerCreate(i, 'test_exec', ['sleep', 'infinity'], ContainerConfig(labels={'test': '1'})),
+                    lambda c: Seq(
+                        lambda: ContainerStart(c),
+                        lambda: ContainerPut(c, '/tmp', ContainerPut.tarinfos({'a.txt': 'a'})),
+                        With(
+                            lambda: ExecCreate(c, ['echo', 'asd']),
+                            lambda e: Seq(lambda: ExecStart(e)),
+                        ),
+                        c,
+                    )
+                )
+            )
+        )
+
+        with self.assertLogs('xmake.op.docker.ExecStart') as logs:
+            c = Executor(should_trace=True).execute(expr)
+
+        self.assertEqual(['asd'], [x.getMessage() for x in logs.records])
+        self.assertEqual(b'a', self.server.docker.container(c['Id']).files['/tmp/a.txt'][1])
+
+    def test_put_compressed(self):
+        contents = bytes(range(256)) * (3 * 4096)
+
+        expr = With(
+            self.server.url,
+            lambda docker: With(
+                ImagePull('alpine:3.5'),
+                lambda i: With(
+                    lambda: ContainerCreate(i, 'test_put', ['true'], ContainerConfig(labels={'test': '1'})),
+                    lambda c: Seq(
+                        lambda: ContainerPut(c, '/tmp', ContainerPut.tarinfos({'a.bin': contents}), compress=True),
+                        c
+                    )
+                )
+            )
+        )
+
+        c = Executor().execute(expr)
+
+        self.assertEqual(contents, self.server.docker.container(c['Id']).files['/tmp/a.bin'][1])
+
+    def test_put_should_compress(self):
+        op = ContainerPut(None, '/tmp', {})
+
+        for url, size, r in [
+            ('tcp://10.0.0.1:2375', COMPRESS_THRESHOLD, True),
+            ('tcp://10.0.0.1:2375', COMPRESS_THRESHOLD - 1, False),
+            ('tcp://127.0.0.1:2375', COMPRESS_THRESHOLD, False),
+            (self.server.url, COMPRESS_THRESHOLD, False),
+        ]:
+            self.assertEqual(r, op.should_compress(SimpleNamespace(url=url), size), url)
+
+        # clients without a url, e.g. created by `docker.from_env()`
+        for host, r in [('tcp://10.0.0.1:2375', True), ('tcp://127.0.0.1:2375', False), (self.server.url, False)]:
+            c = from_env(version='1.41', environment={'DOCKER_HOST': host})
+
+            self.assertEqual(r, op.should_compress(c, COMPRESS_THRESHOLD), host)
+
+            c.close()
+
+    def test_get(self):
+        files = {'a.txt': 'a', 'b.bin': bytes(range(256)) * 1024, 'sub/c.txt': 'c'}
+
+        with tempfile.TemporaryDirectory() as dest:
+            expr = With(
+                self.server.url,
+                lambda docker: With(
+                    ImagePull('alpine:3.5'),
+                    lambda i: With(
+                        lambda: ContainerCreate(i, 'test_get', ['true'], ContainerConfig(labels={'test': '1'})),
+                        lambda c: Seq(
+                            lambda: ContainerPut(c, '/tmp', ContainerPut.tarinfos(files)),
+                            lambda: ContainerGet(c, '/tmp', dest, include=['tmp/*.txt']),
+                        )
+                    )
+                )
+            )
+
+            r = Executor().execute(expr)
+
+            self.assertEqual([os.path.join(os.path.realpath(dest), 'tmp', x) for x in ['a.txt', 'sub/c.txt']], r)
+
+            with open(os.path.join(dest, 'tmp', 'sub', 'c.txt')) as f_obj:
+                self.assertEqual('c', f_obj.read())
+
+            self.assertFalse(os.path.exists(os.path.join(dest, 'tmp', 'b.bin')))
+
+    def test_get_outside(self):
+        for names in [['../a.txt'], ['link', 'link/a.txt']]:
+            body = io.BytesIO()
+
+            with tarfile.open(fileobj=body, mode='w') as tar:
+                for name in names:
+                    member = tarfile.TarInfo(name)
+
+                    if name == 'link':
+                        member.type = tarfile.SYMTYPE
+                        member.linkname = '..'
+
+                    tar.addfile(member, io.BytesIO(b''))
+
+            api = SimpleNamespace(get_archive=lambda *args: ([body.getvalue()], None))
+
+            with tempfile.TemporaryDirectory() as dest, self.assertRaises(ValueError):
+                ContainerGet(Container({'Id': 'a'}), '/', dest).execute(SimpleNamespace(api=api))
+
+    def wait_all(self, names, cmd, timeout=None):
+        return With(
+            self.server.url,
+            lambda docker: With(
+                ImagePull('alpine:3.5'),
+                lambda i: With(
+                    Map(
+                        lambda n: Seq(
+                            lambda: ContainerCreate(i, n, cmd, ContainerConfig(labels={'test': '1'}))
+                        ),
+                        names
+                    ),
+                    lambda cs: Seq(
+                        Map(
+                            lambda x: Seq(
+                                lambda: ContainerStart(x)
+                            ),
+                            cs
+                        ),
+                        lambda: ContainerWaitAll(cs, timeout)
+                    )
+                )
+            )
+        )
+
+    def test_wait_all(self):
+        names = [f'test_wait_{i}' for i in range(20)]
+        docker = self.server.docker
+
+        def kill():
+            while len(docker.containers) < len(names) or any(not x.running for x in docker.containers.values()):
+                sleep(0.01)
+
+            for i, n in enumerate(names):
+                docker.exit(docker.container(n), i)
+
+        thread = threading.Thread(target=kill)
+        thread.start()
+
+        r = Executor().execute(self.wait_all(names, ['sleep', '10']))
+
+        thread.join()
+
+        self.assertEqual(list(range(20)), [x['StatusCode'] for x in r])
+        self.assertEqual(1, docker.requests['events'])
+        self.assertNotIn('container_wait', docker.requests)
+
+    def test_wait_stopped(self):
+        r = Executor().execute(self.wait_all(['test_wait'], ['exit', '3']))
+
+        self.assertEqual([{'StatusCode': 3, 'Error': None}], r)
+
+    def test_pool(self):
+        cmds = [['echo', str(i)] for i in range(6)] + [['exit', '3']]
+        pool = ContainerPool('alpine:3.5', size=2, uses=3)
+
+        expr = With(
+            self.server.url,
+            lambda docker: Seq(
+                ImagePull('alpine:3.5'),
+                lambda: PoolStart(pool),
+                With(
+                    Map(
+                        lambda cmd: Seq(
+                            lambda: PoolExec(pool, cmd)
+                        ),
+                        cmds
+                    ),
+                    lambda r: Seq(
+                        lambda: PoolStop(pool),
+                        r
+                    )
+                )
+            )
+        )
+
+        r = Executor().execute(expr)
+
+        self.assertEqual([f'{i}\n'.encode() for i in range(6)] + [b''], [x['Output'] for x in r])
+        self.assertEqual([0] * 6 + [3], [x['ExitCode'] for x in r])
+
+        # every one of the 2 containers is replaced after 3 commands
+        self.assertEqual(4, self.server.docker.requests['container_create'])
+        self.assertEqual(7, self.server.docker.requests['exec_create'])
+        self.assertEqual({}, self.server.docker.containers)
+
+    def test_pool_failed(self):
+        pool = ContainerPool('alpine:3.5', size=2)
+
+        expr = With(
+            self.server.url,
+            lambda docker: Seq(
+                ImagePull('alpine:3.5'),
+                lambda: PoolStart(pool),
+                Map(
+                    lambda cmd: Seq(
+                        lambda: PoolExec(pool, cmd),
+                        Err('failed')
+                    ),
+                    [['true']]
+                ),
+                lambda: PoolStop(pool),
+            )
+        )
+
+        ex = Executor()
+
+        with self.assertRaises(ExecError):
+            ex.execute(expr)
+
+        self.assertEqual([], ex.teardowns)
+        self.assertEqual({}, self.server.docker.containers)
+        self.assertEqual(2, self.server.docker.requests['container_remove'])
+
+    def test_prune(self):
+        names = [f'test_prune_{i}' for i in range(30)]
+
+        Executor().execute(
+            With(
+                self.server.url,
+                lambda docker: With(
+                    ImagePull('alpine:3.5'),
+                    lambda i: Seq(
+                        lambda: ContainerCreate(i, 'test_prune_kept', ['true']),
+                        Map(
+                            lambda n: With(
+                                lambda: ContainerCreate(i, n, ['sleep', '10'], ContainerConfig(labels={'test': '1'})),
+                                lambda c: Seq(
+                                    lambda: ContainerStart(c)
+                                )
+                            ),
+                            names
+                        )
+                    )
+                )
+            )
+        )
+
+        r = self.clean()
+
+        self.assertEqual(sorted('/' + x for x in names), sorted(x['Names'][0] for x in r))
+        self.assertEqual(['test_prune_kept'], [x.name for x in self.server.docker.containers.values()])
+        self.assertEqual(30, self.server.docker.requests['container_remove'])
+
+    def test_events_url(self):
+        # a client created without a URL, like the one of `docker.from_env()`
+        c = DockerClient(self.server.url)
+        events = DockerEvents.of(c)
+
+        self.assertIs(events, DockerEvents.of(SimpleNamespace(url=self.server.url)))
+        self.assertIs(c, events.cli)
+
+        events.close()
+        c.close()
+
+    def test_events_close(self):
+        with self.assertRaises(ExecError):
+            Executor().execute(self.wait_all(['test_wait'], ['sleep', '10'], timeout=0.1))
+
+        events = DockerEvents.of(SimpleNamespace(url=self.server.url))
+
+        # the wait that timed out is forgotten
+        self.assertEqual({}, events.waits)
+
+        events.close()
+
+        self.assertFalse(events.thread.is_alive())
+        self.assertTrue(events.closed)
+        self.assertIsNot(events, DockerEvents.of(SimpleNamespace(url=self.server.url)))
+
+    def test_prune_unfiltered(self):
+        with self.assertRaises(ValueError):
+            ContainerPrune({})
+
+    def test_prune_failed(self):
+        Executor().execute(self.wait_all(['test_prune_failed'], ['true']))
+
+        loc = Loc.from_frame_idx(2)
+        op = ContainerPrune(filters={'unknown': 'x'})
+
+        with self.assertRaises(ExecError) as e:
+            Executor().execute(With(self.server.url, lambda docker: op))
+
+        self.assertIs(op, e.exception.rec.job)
+        self.assertEqual(loc.shift(1), op._loc)
+        self.assertIn(f'Loc: {loc.shift(1)}', str(e.exception))
+
+    def test_latency(self):
+        self.server.docker.latency = 0.05
+
+        expr = With(
+            self.server.url,
+            lambda docker: Seq(
+                ImagePull('alpine:3.5')
+            )
         )
 
+        started = time()
+        Executor(should_trace=True).execute(expr)
+
+        self.assertGreaterEqual(time() - started, 0.1)
+        self.assertEqual(1, self.server.docker.requests['image_pull'])
+
+    def tearDown(self):
+        self.clean()
+        DockerEvents.close_all()
+        self.server.stop()
+
+
+class TestDockerHosts(unittest.TestCase):
+    def setUp(self):
+        self.servers = [FakeDockerServer().start() for _ in range(3)]
+
+    def create(self, hosts, names, labels=None):
+        return Executor().execute(
+            With(
+                hosts,
+                lambda docker: With(
+                    ImagePull('alpine:3.5'),
+                    lambda i: Map(
+                        lambda n: Seq(
+                            lambda: ContainerCreate(i, n, ['true'], ContainerConfig(labels=labels))
+                        ),
+                        names
+                    )
+                )
+            )
+        )
+
+    def test_least_loaded(self):
+        hosts = DockerHosts([x.url for x in self.servers])
+
+        r = self.create(hosts, ['a', 'b', 'c', 'd'], labels={'test': '1'})
+
+        self.assertEqual([x.url for x in self.servers] + [self.servers[0].url], [x['_host'] for x in r])
+        self.assertEqual([2, 1, 1], [len(x.docker.containers) for x in self.servers])
+
+        # only the first daemon knows `d`
+        Executor().execute(With(hosts, lambda docker: Seq(lambda: ContainerStart(r[3]))))
+
+        self.assertNotEqual('created', self.servers[0].docker.container('d').status)
+
+        r = Executor().execute(With(hosts, lambda docker: Seq(lambda: ContainerWaitAll(r))))
+
+        self.assertEqual([0] * 4, [x['StatusCode'] for x in r])
+
+        r = Executor().execute(With(hosts, lambda docker: ContainerPrune({'label': 'test'})))
+
+        self.assertEqual(4, len(r))
+        self.assertEqual([0, 0, 0], [len(x.docker.containers) for x in self.servers])
+        self.assertEqual({0}, set(hosts.load.values()))
+
+    def test_label(self):
+        hosts = DockerHosts([x.url for x in self.servers], label='job')
+
+        self.create(hosts, ['a', 'b', 'c'], labels={'job': 'x'})
+
+        server = self.servers[zlib.crc32(b'x') % 3]
+
+        self.assertEqual(3, len(server.docker.containers))
+        self.assertEqual(3, sum(len(x.docker.containers) for x in self.servers))
+
+    def test_label_network(self):
+        hosts = DockerHosts([x.url for x in self.servers], label='job')
+
+        Executor().execute(
+            With(
+                hosts,
+                lambda docker: Seq(
+                    lambda: NetworkCreate(Network(), 'a', labels={'job': 'x'}),
+                    lambda: NetworkCreate(Network(), 'b'),
+                )
+            )
+        )
+
+        server = self.servers[zlib.crc32(b'x') % 3]
+
+        self.assertGreaterEqual(server.docker.requests.get('network_create', 0), 1)
+        self.assertEqual(2, sum(x.docker.requests.get('network_create', 0) for x in self.servers))
+
     def tearDown(self):
-        self.setUp()
+        for server in self.servers:
+            server.stop()
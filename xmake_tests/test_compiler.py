@@ -0,0 +1,278 @@
+import unittest
+from unittest.mock import patch
+
+from xmake.compiler import compile_op, transform, walk, fold, substitute, resolve, fuse, reads
+from xmake.dsl import Seq, Con, Match, Case, Fil, Map, With, Fun, Var, Iter, Eval, Op, Err, Call, Ctx, Par, Pipe, Source
+from xmake.executor import Executor
+from xmake.std import assert_not_none
+
+
+def programs():
+    return [
+        Seq(1, 2, 3),
+        Seq(),
+        Match(
+            3,
+            lambda m: [
+                Case(m == 1, 'a'),
+                Case(m == 2, 'b'),
+                Case(m == 3, 'c'),
+            ]
+        ),
+        Fil(lambda x: x > 1, [1, 2, 3]),
+        Map(lambda x: Seq(x, x * 2), [1, 2, 3]),
+        Map(lambda x: x + 1, Fil(lambda x: x > 2, Map(lambda x: x * 2, [1, 2, 3]))),
+        Fil(lambda x: x > 2, Fil(lambda x: x < 5, Source(lambda: range(10)))),
+        With(
+            Fun(lambda a, b: Seq(a, b, a + b)),
+            lambda fn: Map(lambda x: fn(x, 1), [1, 2])
+        ),
+        Iter(
+            Var('x'),
+            Con(0),
+            Eval(Var('x'), lambda x: ((x, x + 1) if x < 5 else (x, None))),
+            Seq(Var('x'), Var('x')),
+        ),
+        assert_not_none(5),
+        Match(
+            [1],
+            lambda m: [
+                Case(m.len == 1, m[0]),
+                Case(True, Err('Wrong number of items: %s', m.len)),
+            ]
+        ),
+        With(
+            Var('a'), Con(5),
+            Eval(Var('a'), Con(1), lambda a, b: a + b) + (Con(2) * 3)
+        ),
+    ]
+
+
+class TestCompiler(unittest.TestCase):
+    def test_results(self):
+        for prog in programs():
+            self.assertEqual(
+                Executor().execute(prog),
+                Executor(compile=True).execute(prog),
+                prog
+            )
+
+    def test_seq(self):
+        prog = Seq(1, 2, 3)
+        comp = compile_op(prog)
+
+        self.assertIsNone(prog.rest)
+        self.assertEqual([0, 1, 2], [comp.start, comp.rest.start, comp.rest.rest.start])
+        self.assertIsNone(comp.rest.rest.rest)
+        self.assertIs(prog.ops, comp.rest.rest.ops)
+        self.assertIs(prog._loc, comp.rest._loc)
+
+    def test_match(self):
+        prog = Match(
+            3,
+            lambda m: [
+                Case(m == 1, 'a'),
+                Case(m == 2, 'b'),
+                Case(m == 3, 'c'),
+            ]
+        )
+
+        prog.table = None
+
+        comp = compile_op(prog)
+
+        with patch.object(Match, '_chain', side_effect=AssertionError):
+            self.assertEqual('c', Executor().execute(comp))
+
+        self.assertIsNone(prog.chain)
+        self.assertEqual([0, 1, 2], [comp.chain.start, comp.chain.rest.start, comp.chain.rest.rest.start])
+
+    def test_idempotent(self):
+        comp = compile_op(Seq(1, 2, 3))
+
+        self.assertIs(comp, compile_op(comp))
+
+    def test_shared(self):
+        shared = Seq(1, 2)
+        prog = Seq(shared, shared)
+
+        comp = compile_op(prog)
+
+        self.assertIsNot(shared, comp.ops[0])
+        self.assertIs(comp.ops[0], comp.ops[1])
+
+    def test_transform(self):
+        def replace(op: Op) -> Op:
+            if isinstance(op, Con) and op.value == 2:
+                return Con(5)
+            return op
+
+        prog = Seq(1, Seq(2, 3))
+
+        comp = transform(prog, replace)
+
+        self.assertEqual(3, Executor().execute(comp))
+        self.assertEqual([1, 5, 3], [x.value for x in walk(comp) if isinstance(x, Con)])
+        self.assertEqual([1, 2, 3], [x.value for x in walk(prog) if isinstance(x, Con)])
+
+    def test_fold(self):
+        prog = Seq(Eval(Con(1), Con(2), lambda x, y: x + y), Eval(Var('x'), Con(1), lambda x, y: x + y) + 1)
+        prog.ops.append(Con(2).__add__(Con(3)))
+
+        comp = transform(prog, fold)
+
+        self.assertIsInstance(comp.ops[0], Eval)
+        self.assertIsInstance(comp.ops[1], Eval)
+        self.assertIsInstance(comp.ops[2], Con)
+
+    def test_fold_mutable(self):
+        items = []
+        prog = Seq(Con(items).len, Con((1, (2, 3))).len)
+
+        comp = transform(prog, fold)
+        items.append(1)
+
+        self.assertNotIsInstance(comp.ops[0], Con)
+        self.assertIsInstance(comp.ops[1], Con)
+        self.assertEqual(2, Executor().execute(comp))
+        self.assertEqual(1, Executor().execute(Seq(comp.ops[0])))
+
+    def test_fold_match(self):
+        prog = Match(
+            (1, 2),
+            lambda m: [
+                Case(m.len == 1, m[0]),
+                Case(m.len == 2, m[1]),
+                Case(True, Err('Wrong number of items: %s', m.len)),
+            ]
+        )
+
+        comp = transform(prog, fold)
+
+        self.assertIsInstance(comp, With)
+        self.assertEqual('m', comp.vars[0].name)
+        self.assertEqual(2, Executor().execute(comp))
+
+    def test_fold_match_dynamic(self):
+        prog = With(
+            Var('y'), Con(1),
+            Match(
+                5,
+                lambda m: [
+                    Case(m == 1, 'a'),
+                    Case(Var('y') == m, 'b'),
+                    Case(True, 'c'),
+                ]
+            )
+        )
+
+        comp = transform(prog, fold)
+
+        self.assertIsInstance(comp.map_op, Match)
+        self.assertEqual(2, len(comp.map_op.cases))
+        self.assertEqual('c', Executor().execute(comp))
+
+    def test_fold_match_unmatched(self):
+        prog = Match(5, lambda m: [Case(m == 1, 'a')])
+
+        self.assertIs(prog, transform(prog, fold))
+
+    def test_substitute(self):
+        prog = Seq(
+            Var('x'),
+            With(Var('x'), Con(2), Var('x')),
+            Call(Fun(lambda x: x), Var('x')),
+        )
+
+        comp = substitute(prog, 'x', Con(1))
+
+        self.assertIsInstance(comp.ops[0], Con)
+        self.assertIs(prog.ops[1], comp.ops[1])
+        self.assertIs(prog.ops[2].fun, comp.ops[2].fun)
+        self.assertIsInstance(comp.ops[2].args[0], Con)
+
+    def test_resolve(self):
+        prog = With(
+            Var('a'), Con(1),
+            Var('b'), Con(2),
+            With(
+                Var('b'), Con(3),
+                Par(
+                    Var('a'),
+                    Var('b'),
+                    Var('docker'),
+                    Map(lambda x: Par(x, Var('a')), [4]),
+                    Call(Fun(lambda x: Par(x, Var('a'))), 5),
+                )
+            )
+        )
+
+        comp = resolve(prog)
+
+        par = comp.map_op.map_op
+        self.assertEqual([1, 0, None], [x.slot for x in par.ops[:3]])
+        self.assertEqual([0, 2], [x.slot for x in par.ops[3].map.ops])
+        self.assertEqual([0, None], [x.slot for x in par.ops[4].fun.body.ops])
+
+        self.assertIsNone(prog.map_op.map_op.ops[0].slot)
+        self.assertIsNone(comp.vars[0].slot)
+
+        self.assertEqual(
+            [1, 3, 'd', [[4, 1]], [5, 1]],
+            Executor().execute(With(Var('docker'), 'd', comp))
+        )
+
+    def test_resolve_shared(self):
+        shared = Var('x') + 1
+
+        comp = resolve(With(Var('x'), 1, Seq(shared, With(Var('y'), 2, shared))))
+
+        self.assertEqual(0, comp.map_op.ops[0].args[0].slot)
+        self.assertEqual(1, comp.map_op.ops[1].map_op.args[0].slot)
+        self.assertEqual(2, Executor().execute(comp))
+
+    def test_reads(self):
+        self.assertEqual({'b', 'c'}, reads(With(Var('a'), Var('c'), Seq(Var('a') + 1, Var('b')))))
+        self.assertEqual({'y'}, reads(Map(lambda x: x + Var('y'), [1, 2])))
+        self.assertIsNone(reads(With(Fun(lambda a: a), lambda fn: Var('b') + fn(1))))
+
+    def test_ctx_slot(self):
+        ctx = Ctx().push('a', 1).push('b', 2).push('a', 3)
+
+        self.assertEqual([3, 2], [ctx.get('a', 0), ctx.get('b', 1)])
+        self.assertEqual([3, 2, 2], [ctx.get('a', 1), ctx.get('b', 0), ctx.get('b', 5)])
+
+        with self.assertRaises(KeyError):
+            ctx.get('c', 0)
+
+    def test_fuse(self):
+        log = []
+
+        def stage(name):
+            def fn(x):
+                log.append((name, x))
+                return x
+
+            return fn
+
+        prog = Map(
+            lambda x: Eval(x, stage('b')),
+            Fil(lambda x: x > 0, Map(lambda x: Eval(x, stage('a')), [0, 1, 2], window=1)),
+        )
+
+        comp = transform(prog, fuse)
+
+        self.assertIsInstance(comp, Pipe)
+        self.assertEqual([Map, Fil, Map], [type(x) for x in comp.stages])
+        self.assertEqual(1, comp.window)
+        self.assertIs(prog.iter.iter.iter, comp.iter)
+
+        self.assertEqual([1, 2], Executor().execute(comp))
+        self.assertEqual([('a', 0), ('a', 1), ('b', 1), ('a', 2), ('b', 2)], log)
+
+        log.clear()
+
+        self.assertEqual([1, 2], Executor().execute(prog))
+        self.assertEqual([('a', 0), ('a', 1), ('a', 2), ('b', 1), ('b', 2)], log)
+
+        self.assertIs(prog.iter.iter, transform(prog.iter.iter, fuse))
@@ -87,3 +87,31 @@ class TestDep(unittest.TestCase):
         deps.put('a')
 
         self.assertEqual(deps.pop(), ('a', []))
+
+    def test_dep_redirect(self):
+        d = Deps()
+        d.put('a', 'b', 'c')
+        d.redirect('b', 'x')
+        self.assertEqual({'a': {'x', 'c'}}, d.deps)
+
+        d.put('c')
+        d.put('x')
+        self.assertEqual(['c', 'x', 'a'], list(d.pending))
+        self.assertEqual(({}, {}), (d.deps, d.deps_rev))
+
+    def test_dep_map_redirect(self):
+        deps = KeyedDeps(lambda x: string.ascii_lowercase.index(x))
+        deps.put('a', 'b', 'c')
+
+        self.assertEqual([0], deps.redirect(1, 'x'))
+
+        deps.put('c')
+        deps.put('x')
+
+        self.assertEqual(deps.pop(), ('c', []))
+        self.assertEqual(deps.pop(), ('x', []))
+        self.assertEqual(deps.pop(), ('a', ['x', 'c']))
+
+        self.assertEqual({}, deps.values)
+        self.assertEqual({}, deps.values_deps)
+        self.assertEqual({}, deps.values_deps_rev)
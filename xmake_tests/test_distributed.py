@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import socket
+import threading
+import unittest
+
+from xmake.distributed import DistributedExecutor, WorkerRef, run_worker, CHUNK
+from xmake.dsl import Op, Par, With, Var, Ctx, Map, Seq
+from xmake.error import ExecError
+from xmake.op.docker import ImagePull, ContainerCreate, ContainerList, ContainerStart, Container, DockerHosts
+from xmake.runtime import JobRec, Step
+from xmake_tests.op.fake_docker import FakeDockerServer
+
+
+class Pid(Op):
+    remote = True
+
+    def execute(self):
+        return os.getpid()
+
+
+class LocalPid(Pid):
+    def __init__(self):
+        # lambdas can not be pickled
+        self.fn = lambda: None
+
+        self.__post_init__()
+
+
+class Repeat(Op):
+    remote = True
+
+    def __init__(self, x):
+        self.x = x
+
+        self.__post_init__()
+
+    def dependencies(self):
+        return [self.x]
+
+    def execute(self, x):
+        return os.getpid(), x * 3
+
+
+class Fail(Op):
+    remote = True
+
+    def execute(self):
+        raise ValueError('broken')
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestDistributed(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeDockerServer().start()
+        cls.workers = []
+        cls.procs = []
+
+        for docker in [cls.server.url, 'tcp://elsewhere:2375']:
+            url = f'udp://127.0.0.1:{_free_port()}'
+
+            proc = multiprocessing.Process(target=run_worker, args=(url,), daemon=True)
+            proc.start()
+
+            cls.workers.append(WorkerRef(url, docker=docker))
+            cls.procs.append(proc)
+
+    @classmethod
+    def tearDownClass(cls):
+        for proc in cls.procs:
+            proc.terminate()
+            proc.join()
+
+        cls.server.stop()
+
+    def executor(self):
+        return DistributedExecutor(workers=[WorkerRef(x.url, x.docker) for x in self.workers])
+
+    def test_remote(self):
+        r = self.executor().execute(Par(*[Pid() for _ in range(6)]))
+
+        self.assertEqual({x.pid for x in self.procs}, set(r))
+
+    def test_locality(self):
+        r = self.executor().execute(With(Var('docker'), 'tcp://elsewhere:2375', Par(*[Pid() for _ in range(4)])))
+
+        self.assertEqual({self.procs[1].pid}, set(r))
+
+    def test_locality_host(self):
+        job = ContainerStart(Container({'Id': 'a', '_host': 'tcp://elsewhere:2375'}))
+        ctx = Ctx().push('docker', self.server.url)
+
+        self.assertEqual(self.workers[1], self.executor().place(JobRec(0, Step.Deps, job, ctx)))
+
+    def test_local(self):
+        self.assertEqual(os.getpid(), self.executor().execute(LocalPid()))
+        self.assertEqual(os.getpid(), DistributedExecutor().execute(Pid()))
+
+    def test_chunks(self):
+        blob = os.urandom(3 * CHUNK + 1)
+
+        pid, r = self.executor().execute(With(Var('blob'), blob, Repeat(Var('blob'))))
+
+        self.assertIn(pid, {x.pid for x in self.procs})
+        self.assertEqual(blob * 3, r)
+
+    def test_read(self):
+        # the lock can not be pickled, but is not read by the job
+        pid, r = self.executor().execute(With(Var('lock'), threading.Lock(), Var('x'), 1, Repeat(Var('x'))))
+
+        self.assertIn(pid, {x.pid for x in self.procs})
+        self.assertEqual(3, r)
+
+    def test_error(self):
+        with self.assertRaises(ExecError) as e:
+            self.executor().execute(Par(Pid(), Fail()))
+
+        self.assertIsInstance(e.exception.e, ValueError)
+
+    def test_docker(self):
+        r = self.executor().execute(
+            With(
+                self.server.url,
+                lambda docker: With(
+                    ImagePull('alpine:3.5'),
+                    lambda i: With(
+                        lambda: ContainerCreate(i, 'dist_a', ['true']),
+                        lambda a: With(
+                            lambda: ContainerCreate(i, 'dist_b', ['true']),
+                            lambda b: Par(a, b)
+                        )
+                    )
+                )
+            )
+        )
+
+        self.assertEqual(2, len(r))
+
+        names = [x['Names'][0] for x in self.executor().execute(With(self.server.url, lambda docker: ContainerList()))]
+
+        self.assertIn('/dist_a', names)
+        self.assertIn('/dist_b', names)
+
+    def test_docker_hosts(self):
+        servers = [FakeDockerServer().start() for _ in range(2)]
+        hosts = DockerHosts([x.url for x in servers])
+
+        # a worker attached to the first daemon, the ones of the class to none
+        url = f'udp://127.0.0.1:{_free_port()}'
+        proc = multiprocessing.Process(target=run_worker, args=(url, {'docker': servers[0].url}), daemon=True)
+        proc.start()
+
+        workers = [WorkerRef(url, servers[0].url)] + [WorkerRef(x.url) for x in self.workers]
+        executor = DistributedExecutor(workers=workers)
+
+        try:
+            r = executor.execute(
+                With(
+                    hosts,
+                    lambda docker: With(
+                        ImagePull('alpine:3.5'),
+                        lambda i: Map(
+                            lambda n: Seq(
+                                lambda: ContainerCreate(i, n, ['true'])
+                            ),
+                            [f'dist_hosts_{i}' for i in range(6)]
+                        )
+                    )
+                )
+            )
+        finally:
+            proc.terminate()
+            proc.join()
+
+            for server in servers:
+                server.stop()
+
+        self.assertEqual([3, 3], [len(x.docker.containers) for x in servers])
+        self.assertEqual({x.url: 3 for x in servers}, hosts.load)
+
+        for server in servers:
+            self.assertEqual({x.id for x in server.docker.containers.values()},
+                             {x['Id'] for x in r if x['_host'] == server.url})
@@ -1,8 +1,14 @@
+import copy
+import pickle
 import unittest
 
-from xmake.dsl import Con, Iter, Eval, Var, With, Match, Case, Fun, Call, Err, OpError, Map, Fil, Loc
+from dataclasses import dataclass, FrozenInstanceError
+
+from xmake.dsl import Con, Iter, Eval, Var, With, Match, Case, Fun, Call, Err, OpError, Map, Fil, Loc, Reduce, If, Op, \
+    CTX_COMPACT_MIN
 from xmake.error import ExecError
 from xmake.executor import Executor
+from xmake.trace import Tracer
 
 
 class TestDSL(unittest.TestCase):
@@ -38,9 +44,8 @@ class TestDSL(unittest.TestCase):
 
         self.assertEqual(6, r)
 
-        # todo
-        # self.assertEqual(ex.reqs, {})
-        # self.assertEqual(ex.rets, {})
+        self.assertEqual(ex.reqs, {})
+        self.assertEqual(ex.rets, {})
 
     def test_match_0(self):
         ex = Executor()
@@ -87,6 +92,53 @@ class TestDSL(unittest.TestCase):
 
         self.assertEqual('c', r)
 
+    def test_match_once(self):
+        calls = []
+
+        def value():
+            calls.append(1)
+            return 5
+
+        r = Executor().execute(
+            Match(
+                Var('x'),
+                Eval(value),
+                Case(Eval(Var('x'), lambda x: x == 1), Con('a')),
+                Case(Eval(Var('x'), lambda x: x == 2), Con('b')),
+                Case(Eval(Var('x'), lambda x: x == 5), Con('c')),
+            )
+        )
+
+        self.assertEqual('c', r)
+        self.assertEqual([1], calls)
+
+    def test_match_table(self):
+        op = Match(
+            Var('x'),
+            lambda m: [
+                Case(m == 1, 'a'),
+                Case(2 == m, 'b'),
+                Case(m == 1, 'c'),
+                Case(True, m),
+            ]
+        )
+
+        self.assertEqual({1: 0, 2: 1}, op.table)
+        self.assertEqual(3, op.default)
+
+        for x, y in [(1, 'a'), (2, 'b'), (3, 3), ([4], [4])]:
+            self.assertEqual(y, Executor().execute(With(Var('x'), Con(x), op)))
+
+        self.assertIsNone(Match(Var('x'), lambda m: [Case(m > 1, 'a'), Case(m == 1, 'b')]).table)
+        self.assertIsNone(Match(Var('x'), lambda m: [Case(m == [1], 'a')]).table)
+
+    def test_match_unmatched(self):
+        for val in [3, [3]]:
+            with self.assertRaises(ExecError) as e:
+                Executor().execute(Match(val, lambda m: [Case(m == 1, 'a')]))
+
+            self.assertEqual('unmatched', e.exception.e.reason)
+
     def test_fun_0(self):
         ex = Executor()
 
@@ -103,6 +155,46 @@ class TestDSL(unittest.TestCase):
 
         self.assertEqual([5, 6, 7], r)
 
+    def test_fun_tail(self):
+        def peak(n, tail_calls=True):
+            class Peak(Tracer):
+                values = 0
+
+                def scheduled(self, rec):
+                    self.values = max(self.values, len(ex.deps))
+
+            tracer = Peak()
+            ex = Executor(tail_calls=tail_calls, tracers=[tracer])
+
+            r = ex.execute(
+                With(
+                    Var('loop'),
+                    Fun(
+                        lambda n, acc: If(
+                            n > 0,
+                            Call(Var('loop'), n - 1, acc + n),
+                            acc
+                        )
+                    ),
+                    Call(Var('loop'), n, 0)
+                )
+            )
+
+            self.assertEqual(n * (n + 1) // 2, r)
+            self.assertEqual(({}, {}), (ex.rets, ex.reqs))
+
+            return tracer.values, ex.metrics().peak_ctx_depth
+
+        self.assertEqual(peak(10)[0], peak(200)[0])
+        # the shadowed mappings are dropped by the tail calls once the context had grown long enough
+        self.assertEqual(peak(200), peak(1000))
+        self.assertLessEqual(peak(1000)[1], CTX_COMPACT_MIN + 1)
+        self.assertLess(peak(10, False)[0], peak(200, False)[0])
+
+    def test_with_twice(self):
+        for ex in [Executor(), Executor(tail_calls=False), Executor(inline=False)]:
+            self.assertEqual(2, ex.execute(With(Var('a'), 1, Var('a'), 2, Var('a'))))
+
     def test_iter_0(self):
         last_items = []
 
@@ -189,35 +281,120 @@ class TestDSL(unittest.TestCase):
 
         self.assertEqual([x for x in inp if x > 1], r)
 
-    def test_map_err_0(self):
+    def test_reduce_0(self):
         ex = Executor(should_trace=True)
 
-        try:
+        for n in range(1, 10):
+            inp = [str(x) for x in range(n)]
+
             r = ex.execute(
-                Map(
-                    Var('x'),
-                    Var('x') > Con(1),
-                    Con(1),
+                Reduce(
+                    lambda a, b: a + b,
+                    Con(inp),
                 )
             )
+
+            self.assertEqual(''.join(inp), r)
+
+    def test_reduce_1(self):
+        ex = Executor()
+
+        self.assertEqual(16, ex.execute(Reduce(lambda a, b: a + b, Con([1, 2, 3]), initial=10)))
+        self.assertEqual(10, ex.execute(Reduce(lambda a, b: a + b, Con([]), initial=10)))
+
+        with self.assertRaises(ExecError) as e:
+            ex.execute(Reduce(lambda a, b: a + b, Con([])))
+
+        self.assertIsInstance(e.exception.e, OpError)
+
+    def test_reduce_depth(self):
+        def depth(op):
+            if isinstance(op, With):
+                return 1 + max(depth(x) for x in op.vals)
+            return 0
+
+        op = Reduce(lambda a, b: a + b, Con([]))
+
+        for n, d in [(1, 0), (2, 1), (3, 2), (4, 2), (5, 3), (1024, 10), (1025, 11)]:
+            tree, = op.post_dependencies(op.execute(list(range(n))))
+            self.assertEqual(d, depth(tree), n)
+
+    def test_map_err_0(self):
+        ex = Executor(should_trace=True)
+
+        loc = Loc.from_frame_idx(2)
+        op = Map(Var('x'), Var('x') > Con(1), Con(1))
+
+        try:
+            r = ex.execute(op)
         except ExecError as e:
             self.assertIsInstance(e.e, OpError)
             self.assertEqual('Returned iterable `1` is not a list', e.e.reason)
-            self.assertEqual(Loc.from_frame_idx(2).shift(-10), e.e.loc)
+            self.assertEqual(loc.shift(1), e.e.loc)
+        else:
+            self.fail(r)
 
     def test_fil_err_0(self):
         ex = Executor(should_trace=True)
 
+        loc = Loc.from_frame_idx(2)
+        op = Fil(Var('x'), Var('x') > Con(1), Con(1))
+
         try:
-            r = ex.execute(
-                Fil(
-                    Var('x'),
-                    Var('x') > Con(1),
-                    Con(1),
-                    )
-            )
+            r = ex.execute(op)
         except ExecError as e:
             self.assertIsInstance(e.e, OpError)
             self.assertEqual('Returned iterable `1` is not a list', e.e.reason)
-            self.assertEqual(Loc.from_frame_idx(2).shift(-10), e.e.loc)
+            self.assertEqual(loc.shift(1), e.e.loc)
+        else:
+            self.fail(r)
+
+    def test_slots(self):
+        for op in [Con(1), Var('x'), Var('x') + 1, With(Var('x'), 1, Var('x')), Map(lambda x: x, [1])]:
+            self.assertFalse(hasattr(op, '__dict__'), op)
+
+        self.assertIs(Con(1)._loc, Con(2)._loc)
+
+        @dataclass(repr=False, eq=False)
+        class UserOp(Op):
+            value: int = 5
+
+            def execute(self) -> int:
+                return self.value
+
+        op = UserOp()
+        op.extra = 1
+
+        self.assertEqual(Loc.from_frame_idx(2).shift(-3), op._loc)
+        self.assertEqual(5, Executor().execute(op))
+
+        with self.assertRaises(AttributeError):
+            Map.__new__(Map).target
+
+    def test_con_shared(self):
+        a = Var('x') + 1
+        b = Var('y') + 1
+
+        self.assertIs(a.args[1], b.args[1])
+
+        loc = Loc.from_frame_idx(2)
+        con = a.args[1]._with_loc(loc)
+
+        self.assertEqual(1, con.value)
+        self.assertIs(loc, con._loc)
+        self.assertIsNone(b.args[1]._loc)
+
+        with self.assertRaises(FrozenInstanceError):
+            b.args[1]._loc = loc
+
+        with self.assertRaises(FrozenInstanceError):
+            b.args[1].value = 2
+
+        self.assertIsNone(b.args[1]._loc)
+        self.assertIs(b.args[1], pickle.loads(pickle.dumps(b.args[1])))
+
+        con = copy.copy(b.args[1])
+        con.value = 2
 
+        self.assertEqual(1, b.args[1].value)
+        self.assertEqual(2, Executor().execute(With(Var('y'), 1, b)))
@@ -1,6 +1,6 @@
 import unittest
 
-from xmake.dsl import Seq, Fun, Match, Case, Err, With, Con, OpError, Map, Fil, Loc
+from xmake.dsl import Seq, Fun, Match, Case, Err, With, Con, OpError, Map, Fil, Loc, _wr
 from xmake.error import ExecError
 from xmake.executor import Executor
 
@@ -205,3 +205,26 @@ class TestDSLExt(unittest.TestCase):
         )
 
         self.assertEqual([1, 2, 3], Executor(should_trace=True).execute(ex))
+
+    def test_wr_const(self):
+        self.assertIs(_wr(1), _wr(1))
+        self.assertIs(_wr('a'), _wr('a'))
+        self.assertIs(_wr(None), _wr(None))
+        self.assertIsNot(_wr(True), _wr(1))
+        self.assertIsNot(_wr([1]), _wr([1]))
+        self.assertIsNot(_wr(1.), _wr(1.))
+        self.assertIsNot(_wr('a' * 100), _wr('a' * 100))
+        self.assertIsNone(_wr(1)._loc)
+
+        self.assertEqual([1, 1], Executor().execute(Map(lambda x: 1, Con([2, 3]))))
+
+    def test_wr_lambda_loc(self):
+        x = 5
+
+        ex = Seq(lambda: x + 1)
+
+        wrapper, = ex.ops
+
+        self.assertEqual(Loc.from_frame_idx(2).shift(-4), wrapper._loc)
+        self.assertIs(wrapper._loc, wrapper.body._loc)
+        self.assertEqual(6, Executor().execute(ex))
@@ -1,6 +1,7 @@
 import unittest
 
-from xmake.dsl import Eval, Con, Log
+from xmake.dsl import Eval, Con, Log, Var, Err, If, With
+from xmake.error import ExecError
 from xmake_tests.test_seq import executor
 
 
@@ -9,3 +10,43 @@ class TestEval(unittest.TestCase):
         self.assertEqual(5, executor(Eval(Con(2), Con(3), 'a + b')))
         self.assertEqual(5, executor(Eval(Con(2), Con(3), lambda a, b: a + b)))
         self.assertEqual(5, executor(Eval(Log(Eval(Con(2), Con(3), lambda a, b: Con(a + b))))))
+
+    def test_fold(self):
+        self.assertIsInstance(Con(2) + 3, Con)
+        self.assertEqual(5, (Con(2) + 3).value)
+        self.assertEqual(True, (Con([1, 2]).len == 2).value)
+        self.assertEqual(2, Con([1, 2])[1].value)
+        self.assertEqual(5, executor(Con(2) + Con(3)))
+
+    def test_fold_not(self):
+        self.assertIsInstance(Var('x') + 3, Eval)
+        self.assertIsInstance(Eval(Con(2), Con(3), lambda a, b: a + b).fold(), Eval)
+
+        # errors are raised by the executor
+        op = Con(1) / 0
+        self.assertIsInstance(op, Eval)
+        with self.assertRaises(ExecError):
+            executor(op)
+
+    def test_and_or(self):
+        self.assertEqual(0, executor(With(Var('x'), Con(0), Var('x') & Err('not lazy'))))
+        self.assertEqual(2, executor(With(Var('x'), Con(1), Var('x') & 2)))
+        self.assertEqual(1, executor(With(Var('x'), Con(1), Var('x') | Err('not lazy'))))
+        self.assertEqual(2, executor(With(Var('x'), Con(0), Var('x') | 2)))
+
+        with self.assertRaises(ExecError):
+            executor(With(Var('x'), Con(0), Var('x') | Err('lazy')))
+
+    def test_and_or_fold(self):
+        right = Var('y')
+
+        self.assertIs(right, Con(1) & right)
+        self.assertIsInstance(Con(0) & right, Con)
+        self.assertIs(right, Con(0) | right)
+        self.assertEqual(1, (Con(1) | right).value)
+
+    def test_if(self):
+        self.assertEqual('a', executor(With(Var('x'), Con(True), If(Var('x'), 'a', Err('not lazy')))))
+        self.assertEqual('b', executor(With(Var('x'), Con(False), If(Var('x'), Err('not lazy'), 'b'))))
+        self.assertEqual(None, executor(With(Var('x'), Con(False), If(Var('x'), Err('not lazy')))))
+        self.assertEqual('a', If(True, 'a', Err('not lazy')).fold().value)
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from xmake.dsl import Con, Map, With, If
+from xmake.executor import Executor
+
+
+class TestMetrics(unittest.TestCase):
+    def test_metrics_0(self):
+        ex = Executor()
+
+        m = ex.metrics()
+
+        self.assertEqual((0, 0, 0, 0.), (m.steps, m.jobs, m.peak_ctx_depth, m.jobs_per_sec))
+
+        self.assertEqual([1, 4, 9], ex.execute(Map(lambda x: x * x, Con([1, 2, 3]))))
+
+        m = ex.metrics()
+
+        self.assertEqual(0, m.pending)
+        self.assertEqual(0, m.blocked)
+        self.assertEqual(m.steps, m.jobs * 5 - m.tail_calls * 2 - m.inlined * 4)
+        self.assertEqual(3, m.tail_calls)
+        self.assertEqual(10, m.inlined)
+        self.assertEqual(1, m.peak_ctx_depth)
+        self.assertGreater(m.jobs_per_sec, 0.)
+
+    def test_metrics_inline(self):
+        def run(inline):
+            ex = Executor(inline=inline)
+            r = ex.execute(Map(lambda x: If(x > 1, x * x, 0), Con([1, 2, 3])))
+            return r, ex.metrics()
+
+        r, m = run(True)
+        r_jobs, m_jobs = run(False)
+
+        self.assertEqual([0, 4, 9], r)
+        self.assertEqual(r_jobs, r)
+        self.assertEqual(m.jobs, m_jobs.jobs)
+        self.assertEqual(0, m_jobs.inlined)
+        self.assertLess(m.steps, m_jobs.steps * .6)
+
+        for x in [m, m_jobs]:
+            self.assertEqual(x.steps, x.jobs * 5 - x.tail_calls * 2 - x.inlined * 4)
+
+    def test_metrics_depth(self):
+        ex = Executor()
+
+        ex.execute(With('a', lambda a: With('b', lambda b: With('c', lambda c: a + b + c))))
+
+        self.assertEqual(3, ex.metrics().peak_ctx_depth)
+
+    def test_metrics_prometheus(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'metrics.prom')
+
+            ex = Executor(metrics_path=path, metrics_interval=0.)
+            ex.execute(Con(1))
+
+            with open(path) as f_obj:
+                body = f_obj.read()
+
+        self.assertIn('# TYPE xmake_executor_jobs counter\n', body)
+        self.assertIn('xmake_executor_jobs 1\n', body)
+        self.assertIn('xmake_executor_pending 0\n', body)
+        self.assertEqual(
+            {x.split(' ')[0] for x in ex.metrics().to_prometheus().splitlines()},
+            {x.split(' ')[0] for x in body.splitlines()},
+        )
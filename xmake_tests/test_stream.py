@@ -0,0 +1,122 @@
+import unittest
+
+from xmake.dsl import Map, Fil, Source, Eval, Var, Con, Stream, Par, Seq
+from xmake.error import ExecError
+from xmake.executor import Executor
+
+
+class Counter:
+    def __init__(self):
+        self.pulled = 0
+        self.done = 0
+        self.in_flight = 0
+
+    def items(self, n):
+        for x in range(n):
+            self.pulled += 1
+            self.in_flight = max(self.in_flight, self.pulled - self.done)
+            yield x
+
+    def start(self, x):
+        self.pulled += 1
+        self.in_flight = max(self.in_flight, self.pulled - self.done)
+        return x
+
+    def finish(self, x):
+        self.done += 1
+        return x * 2
+
+
+class TestStream(unittest.TestCase):
+    def test_map(self):
+        r = Executor().execute(
+            Map(
+                lambda x: x * 2,
+                Source(Con(5), lambda n: range(n)),
+            )
+        )
+
+        self.assertEqual([0, 2, 4, 6, 8], r)
+
+    def test_fil(self):
+        r = Executor().execute(
+            Fil(
+                lambda x: x > 2,
+                Source(Con(5), lambda n: range(n)),
+            )
+        )
+
+        self.assertEqual([3, 4], r)
+
+    def test_empty(self):
+        self.assertEqual([], Executor().execute(Map(lambda x: x, Source(lambda: []))))
+        self.assertEqual([], Executor().execute(Fil(lambda x: x, Source(lambda: []))))
+
+    def test_window(self):
+        ctr = Counter()
+
+        r = Executor().execute(
+            Map(
+                Var('x'),
+                Eval(Var('x'), ctr.finish),
+                Con(Stream(ctr.items(100))),
+                window=3,
+            )
+        )
+
+        self.assertEqual([x * 2 for x in range(100)], r)
+        self.assertEqual(100, ctr.done)
+        self.assertEqual(3, ctr.in_flight)
+
+    def test_error(self):
+        def items():
+            yield 1
+            raise ValueError('broken')
+
+        with self.assertRaises(ExecError) as e:
+            Executor().execute(Map(lambda x: x, Source(items)))
+
+        self.assertIsInstance(e.exception.e, ValueError)
+
+    def test_window_list(self):
+        for window, in_flight in [(None, 10), (1, 1), (3, 3), (100, 10)]:
+            ctr = Counter()
+
+            r = Executor().execute(
+                Map(
+                    Var('x'),
+                    Seq(Eval(Var('x'), ctr.start), Eval(Var('x'), ctr.finish)),
+                    Con(list(range(10))),
+                    window=window,
+                )
+            )
+
+            self.assertEqual([x * 2 for x in range(10)], r)
+            self.assertEqual(in_flight, ctr.in_flight, window)
+
+        self.assertEqual([2, 3], Executor().execute(Fil(lambda x: x > 1, [1, 2, 3], window=2)))
+
+    def test_window_par(self):
+        ctr = Counter()
+
+        r = Executor().execute(
+            Par(
+                *[Seq(Eval(Con(x), ctr.start), Eval(Con(x), ctr.finish)) for x in range(10)],
+                window=4,
+            )
+        )
+
+        self.assertEqual([x * 2 for x in range(10)], r)
+        self.assertEqual(4, ctr.in_flight)
+        self.assertEqual([1, 2], Executor().execute(Par(1, 2, window=4)))
+
+    def test_window_invalid(self):
+        for window in [0, -1]:
+            with self.assertRaises(ValueError):
+                Map(lambda x: x, [1, 2, 3], window=window)
+
+            with self.assertRaises(ValueError):
+                Fil(lambda x: x > 1, Source(lambda: range(3)), window=window)
+
+            with self.assertRaises(ValueError):
+                Par(1, 2, window=window)
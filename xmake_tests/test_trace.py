@@ -0,0 +1,112 @@
+import unittest
+
+from xmake.dsl import Con, Seq, Err, Var
+from xmake.error import ExecError
+from xmake.executor import Executor
+from xmake.runtime import Step
+from xmake.trace import Tracer, Filtered, Sampled
+
+
+class Recorder(Tracer):
+    def __init__(self):
+        self.events = []
+
+    def scheduled(self, rec):
+        self.events.append(('scheduled', rec.ident, rec.step))
+
+    def started(self, rec, deps):
+        self.events.append(('started', rec.ident, rec.step))
+
+    def finished(self, rec, ret, elapsed):
+        self.assert_elapsed(elapsed)
+        self.events.append(('finished', rec.ident, rec.step, ret))
+
+    def failed(self, rec, e, elapsed):
+        self.assert_elapsed(elapsed)
+        self.events.append(('failed', rec.ident, rec.step, e.__class__.__name__))
+
+    def assert_elapsed(self, elapsed):
+        assert elapsed >= 0, elapsed
+
+
+class TestTrace(unittest.TestCase):
+    def test_trace_0(self):
+        rec = Recorder()
+
+        self.assertEqual(1, Executor(tracers=[rec]).execute(Con(1)))
+
+        self.assertEqual(
+            [
+                ('scheduled', 1, Step.Deps),
+                ('started', 1, Step.Deps),
+                ('finished', 1, Step.Deps, []),
+                ('started', 1, Step.Exec),
+                ('finished', 1, Step.Exec, 1),
+                ('started', 1, Step.PostDeps),
+                ('finished', 1, Step.PostDeps, []),
+                ('started', 1, Step.PostExec),
+                ('finished', 1, Step.PostExec, 1),
+                ('started', 1, Step.Result),
+                ('finished', 1, Step.Result, 1),
+            ],
+            rec.events
+        )
+
+    def test_trace_failed(self):
+        rec = Recorder()
+
+        with self.assertRaises(ExecError):
+            Executor(tracers=[rec]).execute(Seq(Err('a')))
+
+        self.assertEqual(('failed', 2, Step.Exec, 'OpError'), rec.events[-1])
+
+    def test_trace_inline(self):
+        rec = Recorder()
+
+        self.assertEqual(1, Executor(tracers=[rec]).execute(Seq(Con(1))))
+
+        self.assertEqual(
+            [
+                ('scheduled', 2, Step.Deps),
+                ('started', 2, Step.Result),
+                ('finished', 2, Step.Result, 1),
+            ],
+            rec.events[3:6]
+        )
+
+        with self.assertRaises(ExecError) as e:
+            Executor(tracers=[rec]).execute(Seq(Var('x')))
+
+        self.assertEqual(('failed', 2, Step.Result, 'OpError'), rec.events[-1])
+        self.assertIsInstance(e.exception.rec.job, Var)
+
+    def test_trace_filtered(self):
+        rec = Recorder()
+
+        Executor(tracers=[Filtered(rec, lambda x: x.step == Step.Result)]).execute(Seq(Con(1), Con(2)))
+
+        self.assertEqual(
+            [('started', 2, Step.Result), ('finished', 2, Step.Result, 1)],
+            rec.events[:2]
+        )
+        self.assertEqual({'started', 'finished'}, {x[0] for x in rec.events})
+
+    def test_trace_sampled(self):
+        rec_all = Recorder()
+        rec_none = Recorder()
+
+        Executor(tracers=[Sampled(rec_all, rate=1.), Sampled(rec_none, rate=0.)]).execute(Seq(Con(1), Con(2)))
+
+        self.assertEqual(
+            [('scheduled', 1, Step.Deps), ('started', 1, Step.Deps)],
+            rec_all.events[:2]
+        )
+        self.assertEqual([], rec_none.events)
+
+    def test_trace_sampled_failed(self):
+        sampled = Sampled(Recorder(), rate=1.)
+
+        with self.assertRaises(ExecError):
+            Executor(tracers=[sampled]).execute(Seq(Err('a')))
+
+        self.assertNotIn(2, sampled.sampled)